@@ -3,6 +3,7 @@ autonomous/curiosity.py — ARC asks questions to fill profile gaps.
 Called by heartbeat during idle time.
 """
 import json
+import time
 
 CURIOSITY_PROMPT = """You are {name}, getting to know your user better.
 
@@ -29,9 +30,19 @@ GAPS_TO_CHECK = [
     ("goals", "what they are trying to achieve"),
 ]
 
-def get_curiosity_question(name: str, user_model, ollama_model: str = "qwen2.5:0.5b") -> str | None:
-    """Returns a question to ask the user, or None if nothing needed."""
-    import ollama
+# Don't re-ask while nothing new has been learned: same known categories
+# means the same gaps and, at best, the same question again.
+CURIOSITY_REPEAT_WINDOW = 3600
+KNOWN_FACTS_MAX_CHARS   = 400
+_last_known: frozenset | None = None
+_last_ts: float = 0.0
+
+def get_curiosity_question(name: str, user_model, ollama_model: str = "qwen2.5:0.5b", client=None) -> str | None:
+    """Returns a question to ask the user, or None if nothing needed.
+    Pass the caller's ollama.Client to reuse its connection pool."""
+    global _last_known, _last_ts
+    if client is None:
+        import ollama as client
 
     # Get known facts
     try:
@@ -41,25 +52,39 @@ def get_curiosity_question(name: str, user_model, ollama_model: str = "qwen2.5:0
     except Exception:
         return None
 
-    known_categories = {f[0] for f in facts}
-    known_facts = "\n".join([f"- {f[0]}: {f[1]}" for f in facts]) or "Nothing yet."
+    known_categories = frozenset(f[0] for f in facts)
 
     # Find gaps
     gaps = [desc for cat, desc in GAPS_TO_CHECK if cat not in known_categories]
     if not gaps:
         return None  # Already know enough
 
+    if known_categories == _last_known and time.time() - _last_ts < CURIOSITY_REPEAT_WINDOW:
+        return None  # Nothing learned since the last question
+    _last_known, _last_ts = known_categories, time.time()
+
+    # Only format the rows that fit in the prompt
+    lines, size = [], 0
+    for cat, fact in facts:
+        line = f"- {cat}: {fact}"
+        if size + len(line) > KNOWN_FACTS_MAX_CHARS:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    known_facts = "\n".join(lines) or "Nothing yet."
+
     gaps_str = "\n".join([f"- {g}" for g in gaps[:3]])
 
     try:
-        resp = ollama.generate(
+        resp = client.generate(
             model=ollama_model,
             prompt=CURIOSITY_PROMPT.format(
                 name=name,
-                known_facts=known_facts[:400],
+                known_facts=known_facts,
                 gaps=gaps_str,
             ),
-            options={"temperature": 0.8, "num_predict": 40, "num_ctx": 512}
+            options={"temperature": 0.8, "num_predict": 40, "num_ctx": 512},
+            keep_alive="1h",
         )
         question = resp["response"].strip()
         if len(question) > 5 and "?" in question:
@@ -15,12 +15,17 @@ Key design:
 """
 
 import asyncio
+import hashlib
+import io
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import ollama
 import re
 import time
-from datetime import datetime, timedelta
-from typing import Callable, Optional, Set
+from datetime import timedelta
+from typing import Optional, Set
 
 from autonomous.task_queue import TaskQueue, _in_hours, _in_minutes
 from autonomous.curiosity import get_curiosity_question
@@ -31,14 +36,44 @@ from autonomous.training_curator import curate_training_data, should_ask_opt_in,
 HEARTBEAT_INTERVAL   = 5 * 60   # Check queue every 5 minutes
 USER_PAUSE_COOLDOWN  = 30       # Wait 30s after user interaction before resuming
 MAX_TASK_DURATION    = 10 * 60  # Kill a task after 10 minutes
-BACKGROUND_MODEL     = "llama3.2:1b"  # Use 1b for background — leaves 3b free for chat
+BACKGROUND_MODEL     = "arc-bg-q4"    # Use 1b for background — leaves 3b free for chat
 CURIOSITY_INTERVAL   = 10  # Ask a curiosity question every N heartbeat cycles
 BACKGROUND_MODEL_FALLBACK = "llama3.1:8b"
 
+# BACKGROUND_MODEL is a local alias built from an explicit Q4_K_M tag — the
+# default llama3.2:1b tag is Q8_0, and decode on the Pi is bandwidth-bound.
+# num_ctx is baked in so every call reuses the same KV allocation.
+BACKGROUND_MODEL_BASE     = "llama3.2:1b-instruct-q4_K_M"
+BACKGROUND_MODEL_UNQUANT  = "llama3.2:1b"   # Used if the alias can't be built
+BACKGROUND_NUM_CTX        = 2048
+
+# Ollama unloads idle models after 5 minutes — exactly one heartbeat. Pin the
+# background model so each tick doesn't pay a multi-second reload.
+BACKGROUND_KEEP_ALIVE = "1h"     # Refreshed on every background call
+PRELOAD_KEEP_ALIVE    = "24h"    # Startup / post-user warmup
+
 # Token budget for background tasks — don't be greedy
 BACKGROUND_TOKEN_BUDGET = 1500
 
-TASK_EXECUTION_PROMPT = """You are an autonomous background agent working on a task.
+# Tool-loop history: once it grows past HISTORY_MAX_MESSAGES, everything
+# between the task prompt and the last HISTORY_KEEP_RECENT messages is folded
+# into one summary so each round doesn't re-send every earlier skill result.
+HISTORY_MAX_MESSAGES = 8
+HISTORY_KEEP_RECENT  = 4
+
+# Model output markers — compiled once, matched every tool round
+_THINK_RE          = re.compile(r"<think>(.*?)</think>", re.DOTALL)
+_FINAL_RE          = re.compile(r"FINAL:\s*(.*?)(?=NEW_TASKS:|$)", re.DOTALL)
+_SKILL_RE          = re.compile(r"SKILL:\s*(\{.*?\})", re.DOTALL)
+_STRIP_SKILL_RE    = re.compile(r"^SKILL:.*$", re.MULTILINE)
+_STRIP_NEWTASKS_RE = re.compile(r"NEW_TASKS:.*", re.DOTALL)
+
+# Prompts are ordered static → volatile so llama.cpp's prefix KV cache can be
+# reused across tool rounds and across tasks. Anything that changes per task
+# must live in TASK_EXECUTION_PROMPT, never in the system prompt.
+# The instruction header has no fields, so it's kept as a plain string and
+# only the short skills/profile tail goes through str.format.
+TASK_SYSTEM_HEADER = """You are an autonomous background agent working on a task.
 You are running silently — the user is NOT watching this interaction.
 
 Your job:
@@ -47,49 +82,58 @@ Your job:
 3. Generate follow-up tasks if your work reveals more to do
 4. Be self-improving: if you find gaps in your capabilities, write new skills
 
-TASK:
-Title: {title}
-Type: {task_type}
-Description: {description}
-Context: {context}
-
-WHAT YOU KNOW ABOUT THE USER:
-{user_context}
-
-RECENT COMPLETED TASKS (for continuity):
-{recent_tasks}
-
-AVAILABLE SKILLS:
-{skills}
-
-SKILL FORMAT: SKILL: {{"name": "...", "args": {{...}}}}
+SKILL FORMAT: SKILL: {"name": "...", "args": {...}}
 FINAL FORMAT: FINAL: <summary of what you did and what you found>
 
 After FINAL, if you want to add follow-up tasks, output:
 NEW_TASKS: [
-  {{"title": "...", "description": "...", "task_type": "...", "priority_name": "normal|low|idle"}},
+  {"title": "...", "description": "...", "task_type": "...", "priority_name": "normal|low|idle"},
   ...
 ]
 
 Work autonomously. Use skills. Search the web. Write code. Do real work."""
 
-REFLECT_PROMPT = """Review the agent's recent activity and suggest what it should focus on next.
+TASK_SYSTEM_CONTEXT = """
 
-Recent completed tasks:
-{completed_tasks}
+AVAILABLE SKILLS:
+{skills}
+
+WHAT YOU KNOW ABOUT THE USER:
+{user_context}"""
+
+TASK_EXECUTION_PROMPT = """TASK:
+Title: {title}
+Type: {task_type}
+Description: {description}
+Context: {context}
+
+RECENT COMPLETED TASKS (for continuity):
+{recent_tasks}"""
+
+# Reflection on unchanged inputs reuses the last answer instead of re-asking
+REFLECTION_CACHE_TTL  = 60 * 60
+REFLECTION_CACHE_SIZE = 8
+
+# Skills list and user profile change slowly — refresh at most this often (seconds)
+CONTEXT_CACHE_TTL = 5 * 60
+
+REFLECT_PROMPT = """Review the agent's recent activity and suggest what it should focus on next.
 
 User profile:
 {user_context}
 
-Current pending task count: {pending_count}
-
 Generate 3-5 new tasks that would make the assistant more useful to this user.
 Consider: gaps in skills, things the user will likely ask about, proactive research,
 self-improvement opportunities, and maintenance tasks.
 
 Return JSON array:
 [{{"title": "...", "description": "...", "task_type": "research|self_improve|prepare|reflect|maintain|custom", "priority_name": "normal|low|idle"}}]
-Return ONLY valid JSON."""
+Return ONLY valid JSON.
+
+Recent completed tasks:
+{completed_tasks}
+
+Current pending task count: {pending_count}"""
 
 
 
@@ -100,23 +144,114 @@ class HeartbeatLoop:
         registry,
         memory,
         user_model,
-        broadcast_fn: Callable,   # async fn(event_dict) — sends to UI
+        listeners: Set[asyncio.Queue],   # per-client SSE queues (bounded) — sends to UI
     ):
         self.queue = task_queue
         self.registry = registry
         self.memory = memory
         self.user_model = user_model
-        self.broadcast = broadcast_fn
         self.db_path = task_queue.db_path if hasattr(task_queue, 'db_path') else None
 
+        # One pooled HTTP client for every background model call
+        self._ollama = ollama.Client()
+        self._bg_model = BACKGROUND_MODEL
+
+        # Model calls get their own thread so a 30s inference never sits in
+        # front of queue/memory reads in the shared default pool.
+        self._ollama_exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ollama")
+        self._db_exec = ThreadPoolExecutor(max_workers=2, thread_name_prefix="heartbeat-db")
+
         self._paused = False
         self._pause_until: Optional[float] = None
+        self._needs_preload = False  # Set on resume, cleared by the next tick
         self._running = False
         self._current_task_id: Optional[int] = None
         self._task_start_time: Optional[float] = None
 
-        # Connected UI clients for status pushes
-        self._status_listeners: Set[asyncio.Queue] = set()
+        # (fetched_at, value) — see _skills_str() / _user_ctx_str()
+        self._skills_cache: tuple[float, str] = (0.0, "")
+        self._user_ctx_cache: tuple[float, str] = (0.0, "")
+        # ((skills, user_context), prompt) — see _task_system_prompt()
+        self._system_prompt_cache: tuple[tuple, str] = ((), "")
+
+        # blake2b(completed|user_context|pending) -> (fetched_at, suggested tasks)
+        self._reflection_cache: dict[bytes, tuple[float, list]] = {}
+
+        # (title, type) hashes of recently queued model-suggested tasks, so
+        # the same follow-up proposed tick after tick is only queued once
+        self._recent_task_hashes: deque = deque(maxlen=256)
+
+        # Connected UI clients for status pushes. Shared with the server, which
+        # adds/removes a queue per SSE connection and drains it there.
+        self._status_listeners = listeners
+
+    # ── Executors ─────────────────────────────────────────────────────────
+
+    async def _call_ollama(self, fn, *args, **kwargs):
+        """Run a blocking model call on the dedicated Ollama thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._ollama_exec, partial(fn, *args, **kwargs)
+        )
+
+    async def _call_db(self, fn, *args, **kwargs):
+        """Run a blocking queue/memory call on the heartbeat's DB threads."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db_exec, partial(fn, *args, **kwargs)
+        )
+
+    # ── Model warmup ──────────────────────────────────────────────────────
+
+    async def _ensure_background_model(self):
+        """Build the quantized background model alias if it doesn't exist yet."""
+        try:
+            await self._call_ollama(self._ollama.show, BACKGROUND_MODEL)
+            return
+        except Exception:
+            pass
+        try:
+            try:
+                await self._call_ollama(self._ollama.show, BACKGROUND_MODEL_BASE)
+            except Exception:
+                # Not in pull_models.sh on older installs — fetch it once (~0.8GB)
+                print(f"[HEARTBEAT] Pulling {BACKGROUND_MODEL_BASE}")
+                await self._call_ollama(self._ollama.pull, BACKGROUND_MODEL_BASE)
+            print(f"[HEARTBEAT] Creating {BACKGROUND_MODEL} from {BACKGROUND_MODEL_BASE}")
+            try:
+                await self._call_ollama(
+                    self._ollama.create,
+                    model=BACKGROUND_MODEL,
+                    from_=BACKGROUND_MODEL_BASE,
+                    parameters={"num_ctx": BACKGROUND_NUM_CTX},
+                )
+            except TypeError:  # ollama-python < 0.4 only takes a Modelfile
+                await self._call_ollama(
+                    self._ollama.create,
+                    model=BACKGROUND_MODEL,
+                    modelfile=f"FROM {BACKGROUND_MODEL_BASE}\n"
+                              f"PARAMETER num_ctx {BACKGROUND_NUM_CTX}",
+                )
+        except Exception as e:
+            print(f"[HEARTBEAT] WARNING: could not create {BACKGROUND_MODEL}: {e} — "
+                  f"falling back to unquantized {BACKGROUND_MODEL_UNQUANT} (slower decode)")
+            self._bg_model = BACKGROUND_MODEL_UNQUANT
+
+    async def _preload_models(self):
+        """Load the background model into Ollama so the next tick starts warm.
+
+        Evaluates the static system prompt too, so the first task of the next
+        tick only prefills its own task text on top of the cached prefix.
+        """
+        try:
+            system = await self._task_system_prompt()
+            await self._call_ollama(
+                self._ollama.chat,
+                model=self._bg_model,
+                messages=[{"role": "system", "content": system}],
+                options={"num_predict": 1, "num_ctx": BACKGROUND_NUM_CTX},
+                keep_alive=PRELOAD_KEEP_ALIVE,
+            )
+        except Exception as e:
+            print(f"[HEARTBEAT] Could not preload {self._bg_model}: {e}")
 
     # ── Pause / resume (called by server on user messages) ───────────────
 
@@ -127,13 +262,17 @@ class HeartbeatLoop:
         if self._current_task_id:
             self.queue.pause_running()
             self._current_task_id = None
-        asyncio.create_task(self._notify("paused", "User active — background work paused"))
+        self._notify("paused", "User active — background work paused")
 
     def resume_after_user(self):
         """Call this N seconds after user interaction completes."""
         self._pause_until = time.time() + USER_PAUSE_COOLDOWN
         self._paused = False
-        asyncio.create_task(self._notify("resuming", f"Resuming background work in {USER_PAUSE_COOLDOWN}s..."))
+        self._notify("resuming", f"Resuming background work in {USER_PAUSE_COOLDOWN}s...")
+        # The user's chat model may have evicted ours. Re-warm it on the first
+        # unpaused tick, not now: with one loaded model (setup.sh) that would
+        # evict the chat model just before the user's next message
+        self._needs_preload = True
 
     def is_paused(self) -> bool:
         if self._pause_until and time.time() < self._pause_until:
@@ -147,6 +286,9 @@ class HeartbeatLoop:
         self._running = True
         print("[HEARTBEAT] Background loop started")
 
+        await self._ensure_background_model()
+        await self._preload_models()
+
         # Initial startup delay — let the server stabilise
         await asyncio.sleep(15)
 
@@ -162,31 +304,35 @@ class HeartbeatLoop:
     async def _tick(self):
         """One heartbeat cycle."""
         if self.is_paused():
-            await self._notify("idle", "Heartbeat: paused for user")
+            self._notify("idle", "Heartbeat: paused for user")
             return
+        if self._needs_preload:
+            self._needs_preload = False
+            await self._preload_models()
 
-        # Check queue
-        task = await asyncio.to_thread(self.queue.next_pending)
+        # Check queue — claiming marks the task running
+        task = await self._call_db(self.queue.claim_next)
 
         if not task:
             # Nothing to do — trigger a reflection to generate new tasks
-            pending = await asyncio.to_thread(self.queue.pending_count)
+            pending = await self._call_db(self.queue.pending_count)
             if pending == 0:
                 # Every N cycles, ask a curiosity question instead of reflecting
                 self._curiosity_counter = getattr(self, '_curiosity_counter', 0) + 1
                 if self._curiosity_counter >= CURIOSITY_INTERVAL:
                     self._curiosity_counter = 0
                     try:
-                        question = await asyncio.to_thread(
+                        question = await self._call_ollama(
                             get_curiosity_question,
                             self.personality.name or "Assistant",
                             self.user_model,
-                            BACKGROUND_MODEL,
+                            self._bg_model,
+                            self._ollama,
                         )
                         if question:
-                            await self._notify("curiosity", f"💬 {question}")
+                            self._notify("curiosity", f"💬 {question}")
                             # Queue it as a proactive suggestion
-                            await asyncio.to_thread(
+                            await self._call_db(
                                 self.queue.add,
                                 title=f"Ask user: {question[:50]}",
                                 description=question,
@@ -198,29 +344,29 @@ class HeartbeatLoop:
                         pass
                 # Curate training data during idle time
                 try:
-                    result = await asyncio.to_thread(curate_training_data, self.db_path)
+                    result = await self._call_db(curate_training_data, self.db_path)
                     if result["curated"] > 0:
-                        await self._notify("training", f"📚 Curated {result['curated']} training examples ({result['total_curated']} total)")
+                        self._notify("training", f"📚 Curated {result['curated']} training examples ({result['total_curated']} total)")
                 except Exception:
                     pass
 
                 # Check if we should ask user to opt into LoRA training
                 try:
-                    if await asyncio.to_thread(should_ask_opt_in, self.db_path):
+                    if await self._call_db(should_ask_opt_in, self.db_path):
                         opt_in_question = (
                             f"I've been learning from our conversations — I now have enough examples "
                             f"to train myself to respond more naturally to you. It would happen overnight "
                             f"while you sleep, entirely on this device. Want me to try?"
                         )
-                        await self._notify("lora_opt_in", opt_in_question)
-                        await asyncio.to_thread(snooze_opt_in, self.db_path, 30)
+                        self._notify("lora_opt_in", opt_in_question)
+                        await self._call_db(snooze_opt_in, self.db_path, 30)
                 except Exception:
                     pass
 
-                await self._notify("reflecting", "Queue empty — reflecting on what to do next...")
+                self._notify("reflecting", "Queue empty — reflecting on what to do next...")
                 await self._run_reflection()
             else:
-                await self._notify("idle", f"{pending} tasks scheduled for later")
+                self._notify("idle", f"{pending} tasks scheduled for later")
             return
 
         # Execute the task
@@ -232,9 +378,8 @@ class HeartbeatLoop:
         task_id = task["id"]
         title = task["title"]
 
-        await self._notify("working", f"📋 Working on: {title}", task=task)
+        self._notify("working", f"📋 Working on: {title}", task=task)
 
-        await asyncio.to_thread(self.queue.start, task_id)
         self._current_task_id = task_id
         self._task_start_time = time.time()
 
@@ -248,9 +393,9 @@ class HeartbeatLoop:
             new_tasks = result.pop("new_tasks", [])
             summary = result.get("output", "Task complete.")
 
-            await asyncio.to_thread(self.queue.complete, task_id, summary)
+            await self._call_db(self.queue.complete, task_id, summary)
 
-            await self._notify(
+            self._notify(
                 "task_done",
                 f"✓ Completed: {title}",
                 task=task,
@@ -258,57 +403,122 @@ class HeartbeatLoop:
             )
 
             # Add follow-up tasks
-            for nt in new_tasks:
+            follow_ups = self._dedupe_tasks([
+                {**nt, "title": nt.get("title") or "Follow-up task"}
+                for nt in new_tasks if isinstance(nt, dict)
+            ])
+            if follow_ups:
                 try:
-                    new_id = await asyncio.to_thread(
-                        self.queue.add,
-                        title=nt.get("title", "Follow-up task"),
-                        description=nt.get("description", ""),
-                        task_type=nt.get("task_type", "custom"),
-                        priority_name=nt.get("priority_name", "normal"),
-                        parent_id=task_id,
+                    new_ids = await self._call_db(self.queue.add_many, follow_ups, task_id)
+                    self._remember_tasks(follow_ups)
+                    self._notify(
+                        "tasks_added",
+                        f"+ Added {len(new_ids)} follow-ups",
+                        titles=[nt["title"] for nt in follow_ups],
                     )
-                    await self._notify("task_added", f"+ Added follow-up: {nt.get('title', '')}")
                 except Exception as e:
-                    print(f"[HEARTBEAT] Error adding follow-up task: {e}")
-
-            # Log to memory
-            await asyncio.to_thread(
-                self.memory.log_interaction,
-                f"[BACKGROUND] {title}",
-                {"category": task["task_type"], "confidence": 1.0},
-                BACKGROUND_MODEL,
-                summary,
-                True, 0,
-                int((time.time() - self._task_start_time) * 1000),
-            )
+                    print(f"[HEARTBEAT] Error adding follow-up tasks: {e}")
 
-            # Update user model from any new info
-            await asyncio.to_thread(
-                self.user_model.extract_from_exchange,
+            # Learn from the result, then log it and store any new facts
+            # in a single memory transaction
+            duration_ms = int((time.time() - self._task_start_time) * 1000)
+            facts = await self._call_ollama(
+                self.user_model.extract_facts,
                 f"[background task: {title}]",
                 summary
             )
+            await self._call_db(
+                self.memory.post_task_commit,
+                (
+                    f"[BACKGROUND] {title}",
+                    {"category": task["task_type"], "confidence": 1.0},
+                    self._bg_model,
+                    summary,
+                    True, 0,
+                    duration_ms,
+                ),
+                self.user_model.store_facts,
+                facts,
+            )
+            if facts:
+                self._user_ctx_cache = (0.0, "")
 
         except asyncio.TimeoutError:
-            await asyncio.to_thread(self.queue.fail, task_id, "Timed out")
-            await self._notify("task_failed", f"✗ Timed out: {title}", task=task)
+            await self._call_db(self.queue.fail, task_id, "Timed out")
+            self._notify("task_failed", f"✗ Timed out: {title}", task=task)
 
         except Exception as e:
             err = str(e)
-            await asyncio.to_thread(self.queue.fail, task_id, err)
-            await self._notify("task_failed", f"✗ Failed: {title} — {err[:80]}", task=task)
+            await self._call_db(self.queue.fail, task_id, err)
+            self._notify("task_failed", f"✗ Failed: {title} — {err[:80]}", task=task)
 
         finally:
             self._current_task_id = None
             self._task_start_time = None
 
+    async def _skills_str(self) -> str:
+        fetched_at, value = self._skills_cache
+        if value and time.time() - fetched_at < CONTEXT_CACHE_TTL:
+            return value
+        value = await asyncio.to_thread(self.registry.list_skills)
+        self._skills_cache = (time.time(), value)
+        return value
+
+    async def _user_ctx_str(self) -> str:
+        fetched_at, value = self._user_ctx_cache
+        if value and time.time() - fetched_at < CONTEXT_CACHE_TTL:
+            return value
+        value = await self._call_db(self.user_model.get_context_for_prompt)
+        self._user_ctx_cache = (time.time(), value)
+        return value
+
+    async def _task_system_prompt(self) -> str:
+        """Static system prompt, only re-formatted when skills or profile change.
+
+        Keeping this byte-identical between calls lets Ollama reuse the
+        evaluated KV prefix instead of re-prefilling skills + profile.
+        """
+        key = tuple(await asyncio.gather(self._skills_str(), self._user_ctx_str()))
+        cached_key, prompt = self._system_prompt_cache
+        if prompt and cached_key == key:
+            return prompt
+
+        prompt = TASK_SYSTEM_HEADER + TASK_SYSTEM_CONTEXT.format(
+            skills=key[0], user_context=key[1]
+        )
+        self._system_prompt_cache = (key, prompt)
+        return prompt
+
+    @staticmethod
+    def _task_hash(nt: dict) -> int:
+        # str() both parts: the model may return a list or dict for either
+        return hash((str(nt["title"]).lower().strip(), str(nt.get("task_type", ""))))
+
+    def _dedupe_tasks(self, tasks: list) -> list:
+        """Drop model-suggested tasks already suggested recently (or twice in
+        this batch). Call _remember_tasks once they're actually queued."""
+        fresh, seen = [], set()
+        for nt in tasks:
+            h = self._task_hash(nt)
+            if h in seen or h in self._recent_task_hashes:
+                continue
+            seen.add(h)
+            fresh.append(nt)
+        return fresh
+
+    def _remember_tasks(self, tasks: list):
+        self._recent_task_hashes.extend(self._task_hash(nt) for nt in tasks)
+
+    def _recent_titles(self, limit: int) -> list:
+        """'title: summary' lines for the last few completed tasks (runs in a thread)."""
+        return [t["title"] + ": " + (t.get("result_summary") or "")[:80]
+                for t in self.queue.get_recent_completed(limit)]
+
     async def _run_task_model(self, task: dict) -> dict:
         """Run a task through the model with tool use."""
-        user_context = await asyncio.to_thread(self.user_model.get_context_for_prompt)
-        recent = await asyncio.to_thread(
-            lambda: [t["title"] + ": " + (t.get("result_summary") or "")[:80]
-                     for t in self.queue.get_recent_completed(5)]
+        system, recent = await asyncio.gather(
+            self._task_system_prompt(),
+            self._call_db(self._recent_titles, 5),
         )
 
         prompt = TASK_EXECUTION_PROMPT.format(
@@ -316,12 +526,13 @@ class HeartbeatLoop:
             task_type=task["task_type"],
             description=task["description"],
             context=json.dumps(task.get("context", {})),
-            user_context=user_context,
             recent_tasks="\n".join(recent) or "None yet.",
-            skills=self.registry.list_skills(),
         )
 
-        messages = [{"role": "user", "content": prompt}]
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ]
         tool_count = 0
         max_tools = 12
         last_reply = ""
@@ -336,24 +547,28 @@ class HeartbeatLoop:
                 }
 
             try:
-                response = await asyncio.to_thread(
-                    ollama.chat,
-                    model=BACKGROUND_MODEL,
+                response = await self._call_ollama(
+                    _chat_until_done,
+                    self._ollama,
+                    model=self._bg_model,
                     messages=messages,
                     options={
                         "temperature": 0.6,
                         "num_predict": BACKGROUND_TOKEN_BUDGET,
-                        "num_ctx": 2048,
-                    }
+                        "num_ctx": BACKGROUND_NUM_CTX,
+                    },
+                    keep_alive=BACKGROUND_KEEP_ALIVE,
                 )
             except ollama.ResponseError as e:
                 if "out of memory" in str(e).lower():
                     # Try fallback model
-                    response = await asyncio.to_thread(
-                        ollama.chat,
+                    response = await self._call_ollama(
+                        _chat_until_done,
+                        self._ollama,
                         model=BACKGROUND_MODEL_FALLBACK,
                         messages=messages,
-                        options={"temperature": 0.6, "num_predict": 800, "num_ctx": 4096}
+                        options={"temperature": 0.6, "num_predict": 800, "num_ctx": 4096},
+                        keep_alive=BACKGROUND_KEEP_ALIVE,
                     )
                 else:
                     raise
@@ -361,8 +576,9 @@ class HeartbeatLoop:
             raw = response["message"]["content"]
             last_reply = raw
 
-            # DeepSeek think blocks
-            think_match = re.search(r"<think>(.*?)</think>", raw, re.DOTALL)
+            # DeepSeek think blocks. Each marker is checked with a plain
+            # substring test first; most replies only contain one of them.
+            think_match = _THINK_RE.search(raw) if "<think>" in raw else None
             reply = raw
             if think_match:
                 thinking_log.append(think_match.group(1).strip())
@@ -372,16 +588,18 @@ class HeartbeatLoop:
 
             # Parse NEW_TASKS
             new_tasks = []
-            new_tasks_match = re.search(r"NEW_TASKS:\s*(\[.*?\])", reply, re.DOTALL)
-            if new_tasks_match:
-                try:
-                    new_tasks = json.loads(new_tasks_match.group(1))
-                    reply = reply[:new_tasks_match.start()].strip()
-                except Exception:
-                    pass
+            new_tasks_idx = reply.find("NEW_TASKS:")
+            if new_tasks_idx >= 0:
+                arr = _find_json_array(reply, new_tasks_idx)
+                if arr:
+                    try:
+                        new_tasks = json.loads(arr)
+                        reply = reply[:new_tasks_idx].strip()
+                    except Exception:
+                        pass
 
             # FINAL answer
-            final_match = re.search(r"FINAL:\s*(.*?)(?=NEW_TASKS:|$)", reply, re.DOTALL)
+            final_match = _FINAL_RE.search(reply) if "FINAL:" in reply else None
             if final_match:
                 return {
                     "output": final_match.group(1).strip(),
@@ -390,24 +608,25 @@ class HeartbeatLoop:
                 }
 
             # SKILL call
-            skill_match = re.search(r"SKILL:\s*(\{.*?\})", reply, re.DOTALL)
+            skill_match = _SKILL_RE.search(reply) if "SKILL:" in reply else None
             if skill_match:
                 try:
                     sc = json.loads(skill_match.group(1))
                     name = sc.get("name", "")
                     args = sc.get("args", {})
 
-                    await self._notify("skill_call", f"⚙ {name}({json.dumps(args)[:80]})")
+                    self._notify("skill_call", f"⚙ {name}({json.dumps(args)[:80]})")
 
-                    result = await asyncio.to_thread(self.registry.run, name, **args)
-                    result_str = str(result)
-                    if len(result_str) > 4000:
-                        result_str = result_str[:3800] + "...[truncated]"
+                    # Serialised in the worker so a huge result never comes back
+                    result_str = await asyncio.to_thread(
+                        _run_skill_bounded, self.registry, name, args
+                    )
 
                     messages.append({
                         "role": "user",
                         "content": f"Skill '{name}' result:\n{result_str}\n\nContinue. FINAL: or use more skills."
                     })
+                    _compact_history(messages)
                     tool_count += 1
                     continue
 
@@ -435,75 +654,248 @@ class HeartbeatLoop:
     async def _run_reflection(self):
         """When queue is empty, reflect and generate new tasks."""
         try:
-            completed = await asyncio.to_thread(self.queue.get_recent_completed, 10)
-            user_context = await asyncio.to_thread(self.user_model.get_context_for_prompt)
-            pending_count = await asyncio.to_thread(self.queue.pending_count)
+            completed, user_context, pending_count = await asyncio.gather(
+                self._call_db(self.queue.get_recent_completed, 10),
+                self._user_ctx_str(),
+                self._call_db(self.queue.pending_count),
+            )
 
             completed_summary = "\n".join([
                 f"- {t['title']}: {(t.get('result_summary') or '')[:80]}"
                 for t in completed
             ]) or "None yet."
 
-            resp = await asyncio.to_thread(
-                ollama.generate,
-                model=BACKGROUND_MODEL,
-                prompt=REFLECT_PROMPT.format(
-                    completed_tasks=completed_summary,
-                    user_context=user_context,
-                    pending_count=pending_count,
-                ),
-                options={"temperature": 0.7, "num_predict": 800, "num_ctx": 3000}
-            )
-
-            text = resp["response"].strip()
-            match = re.search(r"\[.*\]", text, re.DOTALL)
-            if not match:
-                return
+            key = hashlib.blake2b(
+                f"{completed_summary}|{user_context}|{pending_count}".encode(),
+                digest_size=16,
+            ).digest()
+            cached = self._reflection_cache.get(key)
+            if cached and time.time() - cached[0] < REFLECTION_CACHE_TTL:
+                suggested = cached[1]
+            else:
+                resp = await self._call_ollama(
+                    self._ollama.generate,
+                    model=self._bg_model,
+                    prompt=REFLECT_PROMPT.format(
+                        user_context=user_context,
+                        completed_tasks=completed_summary,
+                        pending_count=pending_count,
+                    ),
+                    options={"temperature": 0.7, "num_predict": 800, "num_ctx": BACKGROUND_NUM_CTX},
+                    keep_alive=BACKGROUND_KEEP_ALIVE,
+                )
 
-            new_tasks = json.loads(match.group())
+                text = resp["response"].strip()
+                arr = _find_json_array(text)
+                if not arr:
+                    return
+
+                suggested = [
+                    nt for nt in json.loads(arr)
+                    if isinstance(nt, dict) and nt.get("title")
+                ]
+                self._reflection_cache.pop(key, None)
+                self._reflection_cache[key] = (time.time(), suggested)
+                while len(self._reflection_cache) > REFLECTION_CACHE_SIZE:
+                    self._reflection_cache.pop(next(iter(self._reflection_cache)))
+
+            new_tasks = self._dedupe_tasks(suggested)
             added = 0
-            for nt in new_tasks:
-                if isinstance(nt, dict) and nt.get("title"):
-                    await asyncio.to_thread(
-                        self.queue.add,
-                        title=nt["title"],
-                        description=nt.get("description", ""),
-                        task_type=nt.get("task_type", "custom"),
-                        priority_name=nt.get("priority_name", "idle"),
-                    )
-                    added += 1
+            if new_tasks:
+                new_ids = await self._call_db(
+                    self.queue.add_many, new_tasks, None, "idle"
+                )
+                self._remember_tasks(new_tasks)
+                added = len(new_ids)
 
-            await self._notify("tasks_generated", f"🧠 Reflection complete — added {added} new tasks")
+            self._notify("tasks_generated", f"🧠 Reflection complete — added {added} new tasks")
 
         except Exception as e:
             print(f"[HEARTBEAT] Reflection error: {e}")
 
     # ── Notifications to UI ───────────────────────────────────────────────
 
-    async def _notify(self, event_type: str, message: str, **kwargs):
-        """Broadcast a heartbeat event to all connected UI clients."""
+    def _notify(self, event_type: str, message: str, **kwargs):
+        """Push a heartbeat event to every connected UI client.
+
+        Never blocks: a client whose queue is full just misses the event,
+        so a stalled browser can't hold up the background loop.
+        """
         print(f"[HEARTBEAT] {message}")
-        try:
-            await self.broadcast({
-                "type": f"heartbeat_{event_type}",
-                "message": message,
-                "timestamp": datetime.now().isoformat(),
-                **{k: v for k, v in kwargs.items() if k != "task" or v is None},
-                **({"task_title": kwargs["task"]["title"],
-                    "task_type": kwargs["task"]["task_type"]}
-                   if kwargs.get("task") else {}),
-            })
-        except Exception as e:
-            print(f"[HEARTBEAT] Notify error: {e}")
+        task = kwargs.pop("task", None)
+        event = {
+            "type": f"heartbeat_{event_type}",
+            "message": message,
+            "timestamp": _iso_now(),
+        }
+        event.update(kwargs)
+        if task:
+            event["task_title"] = task["title"]
+            event["task_type"] = task["task_type"]
+        for q in list(self._status_listeners):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
 
     def stop(self):
         self._running = False
+        self._ollama_exec.shutdown(wait=False, cancel_futures=True)
+        self._db_exec.shutdown(wait=False, cancel_futures=True)
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
+_iso_sec: int = -1
+_iso_prefix: str = ""
+
+
+def _iso_now() -> str:
+    """Local ISO-8601 timestamp with milliseconds; the seconds part is
+    formatted at most once per second."""
+    global _iso_sec, _iso_prefix
+    t = time.time()
+    sec = int(t)
+    if sec != _iso_sec:
+        _iso_sec, _iso_prefix = sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+    return f"{_iso_prefix}.{int((t - sec) * 1000):03d}"
+
+
+SKILL_RESULT_LIMIT = 3800
+
+
+def _run_skill_bounded(registry, name: str, args: dict) -> str:
+    return _bounded_repr(registry.run(name, **args))
+
+
+def _bounded_repr(obj, limit: int = SKILL_RESULT_LIMIT) -> str:
+    """str(obj) capped at ~limit chars, without building the full repr of
+    large dicts/lists first. Dict values are clipped to 200 chars each."""
+    if isinstance(obj, dict):
+        items = (f"{k}: {str(v)[:200]}" for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        items = (str(v) for v in obj)
+    else:
+        text = str(obj)
+        return text if len(text) <= limit + 200 else text[:limit] + "...[truncated]"
+
+    buf = io.StringIO()
+    size = 0
+    for item in items:
+        if size + len(item) > limit:
+            buf.write(item[:max(0, limit - size)] + "...[truncated]")
+            break
+        buf.write(item + "\n")
+        size += len(item) + 1
+    return buf.getvalue().rstrip("\n")
+
+
+def _compact_history(messages: list, keep_head: int = 2):
+    """Fold old tool rounds into one summary message, in place.
+
+    The first keep_head messages (system + task) are never touched so the
+    cached prompt prefix stays valid.
+    """
+    if len(messages) <= HISTORY_MAX_MESSAGES:
+        return
+
+    notes = []
+    for m in messages[keep_head:-HISTORY_KEEP_RECENT]:
+        content = m["content"]
+        if m["role"] != "user":
+            continue
+        if content.startswith("[Earlier:"):
+            notes.extend(content.splitlines()[1:])  # carry forward a previous summary
+        elif content.startswith("Skill '"):
+            name, _, result = content[len("Skill '"):].partition("' result:\n")
+            result = result.rsplit("\n\nContinue.", 1)[0]
+            notes.append(f"- {name}: {result[:120].replace(chr(10), ' ')}")
+
+    messages[keep_head:-HISTORY_KEEP_RECENT] = [{
+        "role": "user",
+        "content": f"[Earlier: {len(notes)} skill calls summarised]\n" + "\n".join(notes),
+    }]
+
+
+def _chat_until_done(client: ollama.Client, **kwargs) -> dict:
+    """client.chat, streamed, hanging up as soon as the reply is actionable.
+
+    Closing the stream makes Ollama stop generating, so we don't pay for
+    tokens the tool loop would ignore. Returns the non-streaming shape.
+    """
+    stream = client.chat(stream=True, **kwargs)
+    parts = []
+    try:
+        for chunk in stream:
+            token = chunk["message"]["content"]
+            parts.append(token)
+            if ("}" in token or "]" in token) and _reply_complete("".join(parts)):
+                break
+    finally:
+        stream.close()
+    return {"message": {"role": "assistant", "content": "".join(parts)}}
+
+
+def _reply_complete(text: str) -> bool:
+    """True once the reply holds everything the tool loop will act on:
+    a closed NEW_TASKS array, or a closed SKILL call with no FINAL before it.
+    FINAL alone isn't enough — NEW_TASKS may still follow it."""
+    if "<think>" in text:
+        end = text.find("</think>")
+        if end < 0:
+            return False
+        text = text[end:]
+
+    idx = text.find("NEW_TASKS:")
+    if idx >= 0:
+        start = text.find("[", idx)
+        return start >= 0 and _balanced_end(text, start) is not None
+    if "FINAL:" in text:
+        return False
+    idx = text.find("SKILL:")
+    if idx >= 0:
+        start = text.find("{", idx)
+        return start >= 0 and _balanced_end(text, start) is not None
+    return False
+
+
+def _balanced_end(s: str, start: int) -> Optional[int]:
+    """Index of the bracket closing s[start] ('[' or '{'), skipping JSON strings.
+    None if it isn't closed yet."""
+    depth = 0
+    in_str = esc = False
+    for i in range(start, len(s)):
+        c = s[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "[{":
+            depth += 1
+        elif c in "]}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def _find_json_array(s: str, pos: int = 0) -> Optional[str]:
+    """First balanced JSON array in s at or after pos, in one linear pass.
+    None if there's no '[' or the array is never closed (truncated output)."""
+    start = s.find("[", pos)
+    if start < 0:
+        return None
+    end = _balanced_end(s, start)
+    return s[start:end + 1] if end is not None else None
+
+
 def _strip_meta(text: str) -> str:
-    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
-    text = re.sub(r"^SKILL:.*$", "", text, flags=re.MULTILINE)
-    text = re.sub(r"NEW_TASKS:.*", "", text, flags=re.DOTALL)
+    text = _THINK_RE.sub("", text)
+    text = _STRIP_SKILL_RE.sub("", text)
+    text = _STRIP_NEWTASKS_RE.sub("", text)
     return text.strip()
@@ -20,12 +20,24 @@ Task types:
   custom        — user-defined or agent-defined arbitrary task
 """
 
+import heapq
 import json
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
+try:
+    import orjson
+    _loads = orjson.loads
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+    _dumps = json.dumps
+
 
 PRIORITIES = {
     "critical": 0,
@@ -40,16 +52,58 @@ TASK_TYPES = [
     "reflect", "maintain", "custom"
 ]
 
+# Hot-path statements, kept as single constants so every call site sends the
+# identical SQL text and hits sqlite3's per-connection statement cache
+_INSERT_TASK_SQL = """INSERT INTO tasks
+    (title, description, task_type, priority, priority_name,
+     status, created_at, scheduled_at, tags, context, parent_id, max_retries)
+    VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?, ?, ?)"""
+_LOG_SQL = "INSERT INTO task_log (task_id, timestamp, event, detail) VALUES (?, ?, ?, ?)"
+_TAG_SQL = "INSERT OR IGNORE INTO task_tags (task_id, tag) VALUES (?, ?)"
+_START_SQL = "UPDATE tasks SET status='running', started_at=? WHERE id=?"
+_CLAIM_SQL = "UPDATE tasks SET status='running', started_at=? WHERE id=? AND status='pending' RETURNING *"
+_COMPLETE_SQL = "UPDATE tasks SET status='done', completed_at=?, result_summary=? WHERE id=?"
+_RETRY_SQL = "UPDATE tasks SET status='pending', retry_count=retry_count+1, scheduled_at=? WHERE id=?"
+_FAIL_UPDATE_SQL = "UPDATE tasks SET status='failed', completed_at=?, result_summary=? WHERE id=?"
+
+OPTIMIZE_INTERVAL = 15 * 60  # Run PRAGMA optimize at most this often (seconds)
+CHECKPOINT_INTERVAL = 5 * 60  # Truncate the WAL at most this often (seconds)
+
 
 class TaskQueue:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        # One shared writer (SQLite allows a single writer anyway) plus a
+        # read-only connection per thread, so WAL readers such as the
+        # heartbeat's polls don't queue behind writes on one handle
         self.db = sqlite3.connect(db_path, check_same_thread=False)
-        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.row_factory = sqlite3.Row
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=30000;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-20000;
+            PRAGMA wal_autocheckpoint=1000;
+        """)
+        self._last_optimize = self._last_checkpoint = time.time()
         self._ensure_schema()
+
+        # Mirror of pending rows: (priority, scheduled_at epoch, id). Entries
+        # go stale when a task starts/finishes/moves; next_pending() checks
+        # each candidate against the DB and drops stale ones (lazy deletion).
+        self._pending_heap: list = []
+        self._heap_lock = threading.Lock()
+        self._load_pending_heap()
+
         self._seed_initial_tasks()
 
     def _ensure_schema(self):
+        had_tags_table = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='task_tags'"
+        ).fetchone()
         self.db.executescript("""
             CREATE TABLE IF NOT EXISTS tasks (
                 id              INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -80,9 +134,42 @@ class TaskQueue:
                 FOREIGN KEY(task_id) REFERENCES tasks(id)
             );
 
+            -- One row per tag, so "tasks tagged X" is an index lookup rather
+            -- than a scan over every tasks.tags blob
+            CREATE TABLE IF NOT EXISTS task_tags (
+                task_id     INTEGER NOT NULL,
+                tag         TEXT NOT NULL,
+                PRIMARY KEY(task_id, tag)
+            );
+            CREATE INDEX IF NOT EXISTS idx_task_tags_tag ON task_tags(tag, task_id);
+
             CREATE INDEX IF NOT EXISTS idx_tasks_status_priority
                 ON tasks(status, priority, scheduled_at);
+
+            -- Partial indexes over the hot subsets only: the pending poll /
+            -- pending_count, and the recent-completed listing
+            CREATE INDEX IF NOT EXISTS idx_pending_poll
+                ON tasks(status, priority, scheduled_at, created_at, id)
+                WHERE status='pending';
+            CREATE INDEX IF NOT EXISTS idx_done_completed
+                ON tasks(completed_at DESC, id DESC)
+                WHERE status='done';
+
+            -- Keep roughly the last 10k log rows; pruning every 1000th
+            -- insert keeps the cost off the common path
+            CREATE TRIGGER IF NOT EXISTS task_log_rotate
+            AFTER INSERT ON task_log WHEN NEW.id % 1000 = 0
+            BEGIN
+                DELETE FROM task_log WHERE id < NEW.id - 10000;
+            END;
         """)
+        if not had_tags_table:
+            # Backfill tags of tasks created before task_tags existed
+            self.db.execute(
+                """INSERT OR IGNORE INTO task_tags (task_id, tag)
+                   SELECT tasks.id, je.value FROM tasks, json_each(tasks.tags) AS je
+                   WHERE json_valid(tasks.tags)"""
+            )
         self.db.commit()
 
     def _seed_initial_tasks(self):
@@ -150,8 +237,47 @@ class TaskQueue:
             },
         ]
 
-        for task in initial_tasks:
-            self.add(**task)
+        now = _now_iso()
+        with self._write_lock, self.db:
+            self.db.executemany(_INSERT_TASK_SQL, [
+                (
+                    t["title"], t["description"], t.get("task_type", "custom"),
+                    PRIORITIES.get(t.get("priority_name", "normal"), 2),
+                    t.get("priority_name", "normal"),
+                    now, t.get("scheduled_at") or now,
+                    _dumps(t.get("tags") or []), _dumps(t.get("context") or {}),
+                    None, 2,
+                )
+                for t in initial_tasks
+            ])
+            # One multi-row insert into an empty table: ids are contiguous
+            last_id = self.db.execute("SELECT last_insert_rowid()").fetchone()[0]
+            ids = range(last_id - len(initial_tasks) + 1, last_id + 1)
+            self.db.executemany(_LOG_SQL, [
+                (
+                    task_id, now, "created",
+                    f"priority={t.get('priority_name', 'normal')}, type={t.get('task_type', 'custom')}",
+                )
+                for task_id, t in zip(ids, initial_tasks)
+            ])
+            self.db.executemany(_TAG_SQL, [
+                (task_id, tag)
+                for task_id, t in zip(ids, initial_tasks)
+                for tag in t.get("tags") or []
+            ])
+        self._load_pending_heap()
+
+    def _load_pending_heap(self):
+        rows = self.db.execute(
+            "SELECT priority, scheduled_at, id FROM tasks WHERE status='pending'"
+        ).fetchall()
+        with self._heap_lock:
+            self._pending_heap = [(p, _epoch(at), task_id) for p, at, task_id in rows]
+            heapq.heapify(self._pending_heap)
+
+    def _push_pending(self, task_id: int, priority: int, scheduled_at: str):
+        with self._heap_lock:
+            heapq.heappush(self._pending_heap, (priority, _epoch(scheduled_at), task_id))
 
     # ── CRUD ─────────────────────────────────────────────────────────────
 
@@ -168,168 +294,325 @@ class TaskQueue:
         max_retries: int = 2,
     ) -> int:
         priority = PRIORITIES.get(priority_name, 2)
-        cursor = self.db.execute(
-            """INSERT INTO tasks
-               (title, description, task_type, priority, priority_name,
-                status, created_at, scheduled_at, tags, context, parent_id, max_retries)
-               VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?, ?, ?)""",
-            (
-                title, description, task_type, priority, priority_name,
-                datetime.now().isoformat(),
-                scheduled_at or datetime.now().isoformat(),
-                json.dumps(tags or []),
-                json.dumps(context or {}),
-                parent_id,
-                max_retries,
+        now = _now_iso()
+        scheduled_at = scheduled_at or now
+        with self._write_lock, self.db:
+            cursor = self.db.execute(
+                _INSERT_TASK_SQL,
+                (
+                    title, description, task_type, priority, priority_name,
+                    now,
+                    scheduled_at,
+                    _dumps(tags or []),
+                    _dumps(context or {}),
+                    parent_id,
+                    max_retries,
+                )
             )
-        )
-        self.db.commit()
-        task_id = cursor.lastrowid
-        self._log(task_id, "created", f"priority={priority_name}, type={task_type}")
+            task_id = cursor.lastrowid
+            self._log(task_id, "created", f"priority={priority_name}, type={task_type}", now)
+            if tags:
+                self.db.executemany(_TAG_SQL, [(task_id, tag) for tag in tags])
+        self._push_pending(task_id, priority, scheduled_at)
         return task_id
 
+    def add_many(
+        self,
+        tasks: list,
+        parent_id: Optional[int] = None,
+        default_priority: str = "normal",
+    ) -> list:
+        """Insert several tasks (dicts with add()'s fields) in one transaction.
+        Tasks whose title is already pending or running are skipped."""
+        now = _now_iso()
+        ids = []
+        queued = []
+        with self._write_lock, self.db:
+            for t in tasks:
+                # Fields usually come straight from model JSON: coerce them so
+                # one malformed task can't fail the binding for the whole batch
+                title = str(t["title"])
+                if self.db.execute(
+                    "SELECT 1 FROM tasks WHERE title=? AND status IN ('pending','running') LIMIT 1",
+                    (title,)
+                ).fetchone():
+                    continue
+                task_type = t.get("task_type", "custom")
+                if not isinstance(task_type, str) or task_type not in TASK_TYPES:
+                    task_type = "custom"
+                priority_name = t.get("priority_name", default_priority)
+                if not isinstance(priority_name, str) or priority_name not in PRIORITIES:
+                    priority_name = default_priority
+                priority = PRIORITIES.get(priority_name, 2)
+                scheduled_at = t.get("scheduled_at")
+                scheduled_at = scheduled_at if isinstance(scheduled_at, str) and scheduled_at else now
+                tags = t.get("tags") or []
+                tags = [str(tag) for tag in tags] if isinstance(tags, list) else []
+                max_retries = t.get("max_retries", 2)
+                if not isinstance(max_retries, int):
+                    max_retries = 2
+                cursor = self.db.execute(
+                    _INSERT_TASK_SQL,
+                    (
+                        title, str(t.get("description", "")), task_type,
+                        priority, priority_name,
+                        now,
+                        scheduled_at,
+                        _dumps(tags),
+                        _dumps(t.get("context") or {}),
+                        parent_id,
+                        max_retries,
+                    )
+                )
+                ids.append(cursor.lastrowid)
+                queued.append((cursor.lastrowid, priority, scheduled_at))
+                self.db.execute(
+                    _LOG_SQL,
+                    (cursor.lastrowid, now, "created", f"priority={priority_name}, type={task_type}")
+                )
+                if tags:
+                    self.db.executemany(_TAG_SQL, [(cursor.lastrowid, tag) for tag in tags])
+        for task_id, priority, scheduled_at in queued:
+            self._push_pending(task_id, priority, scheduled_at)
+        return ids
+
     def next_pending(self) -> Optional[dict]:
         """Get the highest-priority pending task that's due now."""
-        now = datetime.now().isoformat()
-        row = self.db.execute(
-            """SELECT * FROM tasks
-               WHERE status='pending' AND scheduled_at <= ?
-               ORDER BY priority ASC, created_at ASC
-               LIMIT 1""",
-            (now,)
-        ).fetchone()
+        task_id = self._peek_next_id()
+        return self.get(task_id) if task_id is not None else None
+
+    def claim_next(self) -> Optional[dict]:
+        """Pick the next due task and mark it running in one statement."""
+        with self._write_lock:
+            task_id = self._peek_next_id()
+            if task_id is None:
+                return None
+            with self.db:
+                now = _now_iso()
+                row = self.db.execute(_CLAIM_SQL, (now, task_id)).fetchone()
+                if row:
+                    self._log(task_id, "started", "", now)
+        return _row_to_dict(row) if row else None
+
+    def _peek_next_id(self) -> Optional[int]:
+        """Id of the highest-priority due task, checking only the columns the heap keys on."""
+        self._maybe_optimize()
+        now = time.time()
+        not_due = []
+        found = None
+        with self._heap_lock:
+            heap = self._pending_heap
+            while heap:
+                priority, due, task_id = heap[0]
+                if due > now:
+                    not_due.append(heapq.heappop(heap))
+                    continue
+                row = self._reader().execute(
+                    "SELECT priority, scheduled_at FROM tasks WHERE id=? AND status='pending'", (task_id,)
+                ).fetchone()
+                if not row or row[0] != priority or _epoch(row[1]) != due:
+                    heapq.heappop(heap)  # Stale: started, finished, or rescheduled
+                    continue
+                # Left on the heap until start() makes it stale, so a task
+                # that's fetched but never started isn't lost
+                found = task_id
+                break
+            for entry in not_due:
+                heapq.heappush(heap, entry)
+        return found
+
+    def get(self, task_id: int) -> Optional[dict]:
+        row = self._reader().execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
         return _row_to_dict(row) if row else None
 
     def start(self, task_id: int):
-        self.db.execute(
-            "UPDATE tasks SET status='running', started_at=? WHERE id=?",
-            (datetime.now().isoformat(), task_id)
-        )
-        self.db.commit()
-        self._log(task_id, "started")
+        with self._write_lock, self.db:
+            now = _now_iso()
+            self.db.execute(_START_SQL, (now, task_id))
+            self._log(task_id, "started", "", now)
 
     def complete(self, task_id: int, result_summary: str):
-        self.db.execute(
-            """UPDATE tasks SET status='done', completed_at=?, result_summary=?
-               WHERE id=?""",
-            (datetime.now().isoformat(), result_summary[:1000], task_id)
-        )
-        self.db.commit()
-        self._log(task_id, "completed", result_summary[:200])
+        with self._write_lock, self.db:
+            now = _now_iso()
+            self.db.execute(_COMPLETE_SQL, (now, result_summary[:1000], task_id))
+            self._log(task_id, "completed", result_summary[:200], now)
 
     def fail(self, task_id: int, reason: str):
-        row = self.db.execute(
-            "SELECT retry_count, max_retries FROM tasks WHERE id=?", (task_id,)
-        ).fetchone()
-        if not row:
-            return
+        with self._write_lock, self.db:
+            row = self.db.execute(
+                "SELECT retry_count, max_retries FROM tasks WHERE id=?", (task_id,)
+            ).fetchone()
+            if not row:
+                return
+
+            retry_count, max_retries = row
+            retried = retry_count < max_retries
+            if retried:
+                # Retry with exponential backoff
+                delay_minutes = 5 * (2 ** retry_count)
+                retry_at = (datetime.now() + timedelta(minutes=delay_minutes)).isoformat()
+                self.db.execute(_RETRY_SQL, (retry_at, task_id))
+                self._log(task_id, "retry_scheduled", f"attempt {retry_count+1}, retry in {delay_minutes}m")
+            else:
+                now = _now_iso()
+                self.db.execute(_FAIL_UPDATE_SQL, (now, f"FAILED: {reason}", task_id))
+                self._log(task_id, "failed", reason, now)
+        # Only once committed, so a reader never sees the heap entry first
+        if retried:
+            self._repush(task_id)
 
-        retry_count, max_retries = row
-        if retry_count < max_retries:
-            # Retry with exponential backoff
-            delay_minutes = 5 * (2 ** retry_count)
-            retry_at = (datetime.now() + timedelta(minutes=delay_minutes)).isoformat()
-            self.db.execute(
-                """UPDATE tasks SET status='pending', retry_count=retry_count+1,
-                   scheduled_at=? WHERE id=?""",
-                (retry_at, task_id)
-            )
-            self._log(task_id, "retry_scheduled", f"attempt {retry_count+1}, retry in {delay_minutes}m")
-        else:
+    def cancel(self, task_id: int, reason: str = ""):
+        with self._write_lock, self.db:
+            now = _now_iso()
             self.db.execute(
-                "UPDATE tasks SET status='failed', completed_at=?, result_summary=? WHERE id=?",
-                (datetime.now().isoformat(), f"FAILED: {reason}", task_id)
+                "UPDATE tasks SET status='cancelled', completed_at=? WHERE id=?",
+                (now, task_id)
             )
-            self._log(task_id, "failed", reason)
-        self.db.commit()
-
-    def cancel(self, task_id: int, reason: str = ""):
-        self.db.execute(
-            "UPDATE tasks SET status='cancelled', completed_at=? WHERE id=?",
-            (datetime.now().isoformat(), task_id)
-        )
-        self.db.commit()
-        self._log(task_id, "cancelled", reason)
+            self._log(task_id, "cancelled", reason, now)
 
     def reschedule(self, task_id: int, when: str):
-        self.db.execute(
-            "UPDATE tasks SET status='pending', scheduled_at=? WHERE id=?",
-            (when, task_id)
-        )
-        self.db.commit()
-        self._log(task_id, "rescheduled", when)
+        with self._write_lock, self.db:
+            self.db.execute(
+                "UPDATE tasks SET status='pending', scheduled_at=? WHERE id=?",
+                (when, task_id)
+            )
+            self._log(task_id, "rescheduled", when)
+        self._repush(task_id)
 
     def pause_running(self):
-        """Pause any running task when user interaction takes priority."""
-        self.db.execute(
-            "UPDATE tasks SET status='pending', started_at=NULL WHERE status='running'"
-        )
-        self.db.commit()
+        """Pause any running task when user interaction takes priority.
+        Logs a 'paused' event per task in the same transaction."""
+        with self._write_lock, self.db:
+            self.db.execute(
+                """INSERT INTO task_log (task_id, timestamp, event, detail)
+                   SELECT id, ?, 'paused', '' FROM tasks WHERE status='running'""",
+                (_now_iso(),)
+            )
+            paused = self.db.execute(
+                """UPDATE tasks SET status='pending', started_at=NULL WHERE status='running'
+                   RETURNING id, priority, scheduled_at"""
+            ).fetchall()
+        for task_id, priority, scheduled_at in paused:
+            self._push_pending(task_id, priority, scheduled_at)
+
+    def _repush(self, task_id: int):
+        """Queue a task that just became pending again, from its current row."""
+        row = self.db.execute(
+            "SELECT priority, scheduled_at FROM tasks WHERE id=?", (task_id,)
+        ).fetchone()
+        if row:
+            self._push_pending(task_id, row[0], row[1])
 
     def resume_paused(self):
         """No-op — paused tasks automatically become pending again."""
         pass
 
     def pending_count(self) -> int:
-        return self.db.execute(
+        return self._reader().execute(
             "SELECT COUNT(*) FROM tasks WHERE status='pending'"
         ).fetchone()[0]
 
     def get_all(self, status: str = None, limit: int = 50) -> list:
         if status:
-            rows = self.db.execute(
-                "SELECT * FROM tasks WHERE status=? ORDER BY priority ASC, created_at ASC LIMIT ?",
+            rows = self._reader().execute(
+                "SELECT * FROM tasks WHERE status=? ORDER BY priority ASC, created_at ASC, id ASC LIMIT ?",
                 (status, limit)
             ).fetchall()
         else:
-            rows = self.db.execute(
-                "SELECT * FROM tasks ORDER BY priority ASC, created_at DESC LIMIT ?",
+            rows = self._reader().execute(
+                "SELECT * FROM tasks ORDER BY priority ASC, created_at DESC, id DESC LIMIT ?",
                 (limit,)
             ).fetchall()
         return [_row_to_dict(r) for r in rows]
 
+    def get_by_tag(self, tag: str, status: str = None, limit: int = 50) -> list:
+        """Tasks carrying a tag, newest first."""
+        sql = "SELECT tasks.* FROM task_tags JOIN tasks ON tasks.id = task_tags.task_id WHERE task_tags.tag=?"
+        params = [tag]
+        if status:
+            sql += " AND tasks.status=?"
+            params.append(status)
+        rows = self._reader().execute(
+            sql + " ORDER BY task_tags.task_id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
     def get_recent_completed(self, n: int = 10) -> list:
-        rows = self.db.execute(
-            "SELECT * FROM tasks WHERE status='done' ORDER BY completed_at DESC LIMIT ?", (n,)
+        rows = self._reader().execute(
+            "SELECT * FROM tasks WHERE status='done' ORDER BY completed_at DESC, id DESC LIMIT ?", (n,)
         ).fetchall()
         return [_row_to_dict(r) for r in rows]
 
     def summary(self) -> dict:
         counts = {}
         for status in ("pending", "running", "done", "failed", "cancelled"):
-            counts[status] = self.db.execute(
+            counts[status] = self._reader().execute(
                 "SELECT COUNT(*) FROM tasks WHERE status=?", (status,)
             ).fetchone()[0]
         return counts
 
-    def _log(self, task_id: int, event: str, detail: str = ""):
-        self.db.execute(
-            "INSERT INTO task_log (task_id, timestamp, event, detail) VALUES (?, ?, ?, ?)",
-            (task_id, datetime.now().isoformat(), event, detail)
-        )
-        self.db.commit()
+    def _log(self, task_id: int, event: str, detail: str = "", timestamp: str = None):
+        """Append to task_log. Callers commit, together with their own write,
+        and pass the timestamp they already used for it."""
+        self.db.execute(_LOG_SQL, (task_id, timestamp or _now_iso(), event, detail))
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only=1")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _maybe_optimize(self):
+        """Periodic upkeep, piggybacked on polling: refresh planner stats
+        (cheap when nothing changed) and truncate the WAL so it stays small."""
+        now = time.time()
+        if now - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self._last_checkpoint = now
+            try:
+                with self._write_lock:
+                    self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+        if now - self._last_optimize < OPTIMIZE_INTERVAL:
+            return
+        self._last_optimize = now
+        try:
+            with self._write_lock:
+                self.db.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
 def _in_hours(n: float) -> str:
     return (datetime.now() + timedelta(hours=n)).isoformat()
 
 def _in_minutes(n: float) -> str:
     return (datetime.now() + timedelta(minutes=n)).isoformat()
 
+def _epoch(iso: Optional[str]) -> float:
+    """scheduled_at → epoch seconds; unparseable means due now."""
+    try:
+        return datetime.fromisoformat(iso).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
 def _row_to_dict(row) -> dict:
     if not row:
         return None
-    keys = [
-        "id", "title", "description", "task_type", "priority", "priority_name",
-        "status", "created_at", "scheduled_at", "started_at", "completed_at",
-        "result_summary", "retry_count", "max_retries", "parent_id", "tags", "context"
-    ]
-    d = dict(zip(keys, row))
+    d = dict(row)
     try:
-        d["tags"] = json.loads(d.get("tags") or "[]")
-        d["context"] = json.loads(d.get("context") or "{}")
+        d["tags"] = _loads(d.get("tags") or "[]")
+        d["context"] = _loads(d.get("context") or "{}")
     except Exception:
         pass
     return d
@@ -6,6 +6,15 @@ Intent classification using qwen2.5:0.5b — stays hot in RAM.
 import ollama
 import json
 import re
+from functools import lru_cache
+
+from core.fast_classifier import fast_classify
+
+try:
+    import orjson
+    _loads = orjson.loads  # Raises a json.JSONDecodeError subclass, like json
+except ImportError:
+    _loads = json.loads
 
 CATEGORIES = [
     "general_chat", "coding", "debugging", "math", "reasoning",
@@ -15,6 +24,7 @@ CATEGORIES = [
     "research", "sentiment_analysis", "structured_output",
     "skill_writing", "error_recovery", "safety_check", "agentic_task",
 ]
+_CATEGORY_SET = frozenset(CATEGORIES)
 
 CLASSIFIER_PROMPT = """Classify this user input into exactly one category. Return JSON only, no explanation.
 
@@ -33,33 +43,35 @@ Input: {input}
 
 JSON format: {{"category": "<category>", "confidence": <0.0-1.0>, "subtask": "<10 word description>"}}"""
 
+_JSON_RE = re.compile(r"\{.*?\}", re.DOTALL)
+
+# The prompt around {input} never changes — format it once
+_PROMPT_HEAD, _PROMPT_TAIL = CLASSIFIER_PROMPT.format(
+    categories=", ".join(CATEGORIES), input="\0"
+).split("\0")
+
+# Pooled connection to the local Ollama server
+_client = ollama.Client()
+
+
+FAST_CONFIDENCE = 0.8  # Heuristic verdicts at or above this skip the model
 
-def classify_intent(user_input: str) -> dict:
-    try:
-        response = ollama.generate(
-            model="qwen2.5:0.5b",
-            prompt=CLASSIFIER_PROMPT.format(
-                categories=", ".join(CATEGORIES),
-                input=user_input[:500],  # truncate huge inputs
-            ),
-            options={
-                "temperature": 0.1,
-                "num_predict": 120,
-                "num_ctx": 1024,
-            }
-        )
 
-        text = response["response"].strip()
+def classify(user_input: str) -> dict:
+    """Single entry point: sub-millisecond heuristics first, the 0.5b model
+    only when they're unsure (e.g. the general_chat default)."""
+    result = fast_classify(user_input)
+    if result["confidence"] >= FAST_CONFIDENCE:
+        result["subtask"] = user_input[:60]
+        return result
+    return classify_intent(user_input)
 
-        # Robust JSON extraction
-        match = re.search(r"\{.*?\}", text, re.DOTALL)
-        if match:
-            result = json.loads(match.group())
-            # Validate category
-            if result.get("category") not in CATEGORIES:
-                result["category"] = "general_chat"
-            return result
 
+def classify_intent(user_input: str) -> dict:
+    try:
+        result = _llm_classify(user_input[:500])  # truncate huge inputs
+        if result:
+            return dict(result)  # Callers get their own copy of the cached dict
     except json.JSONDecodeError:
         pass
     except Exception as e:
@@ -69,28 +81,83 @@ def classify_intent(user_input: str) -> dict:
     return _heuristic_classify(user_input)
 
 
+@lru_cache(maxsize=512)
+def _llm_classify(user_input: str):
+    """Model classification for an input (temperature 0.1, so repeat inputs
+    reuse the cached answer). Errors propagate and aren't cached."""
+    response = _client.generate(
+        model="qwen2.5:0.5b",
+        prompt=_PROMPT_HEAD + user_input + _PROMPT_TAIL,
+        options={
+            "temperature": 0.1,
+            "num_predict": 120,
+            "num_ctx": 1024,
+        },
+        keep_alive="24h",
+    )
+
+    text = response["response"].strip()
+
+    # Robust JSON extraction
+    match = _JSON_RE.search(text)
+    if not match:
+        return None
+    result = _loads(match.group())
+    # Validate category
+    if result.get("category") not in _CATEGORY_SET:
+        result["category"] = "general_chat"
+    return result
+
+
+# Keyword → category, checked in order: the first listed category that has
+# any keyword in the text wins
+HEURISTICS = [
+    (["write a skill", "create a skill", "new skill", "new tool"],   "skill_writing"),
+    (["debug", "fix this", "error:", "traceback", "exception"],      "debugging"),
+    (["def ", "class ", "function", "import ", "#!/"],               "coding"),
+    (["bash", "shell", "terminal", "sudo", "apt", "pip install"],    "shell_command"),
+    (["math", "calculate", "equation", "integral", "proof"],         "math"),
+    (["search for", "look up", "what is the latest", "current"],     "web_search"),
+    (["summarize", "tldr", "summary of"],                            "summarization"),
+    (["translate", "in french", "in spanish", "in german"],          "translation"),
+    (["plan", "schedule", "roadmap", "steps to"],                    "planning"),
+    (["analyze", "csv", "dataframe", "dataset", "statistics"],       "data_analysis"),
+    (["write a story", "write a poem", "creative"],                  "creative_writing"),
+    (["screenshot", "what's on screen", "capture screen"],           "screenshot_analysis"),
+    (["image", "photo", "picture", "describe this"],                 "image_description"),
+    (["research", "investigate", "deep dive", "comprehensive"],      "research"),
+]
+
+# One Aho-Corasick pass finds every keyword at once; without pyahocorasick
+# we fall back to checking each list in turn
+try:
+    import ahocorasick
+    _AC = ahocorasick.Automaton()
+    for _rank, (_keywords, _category) in enumerate(HEURISTICS):
+        for _kw in _keywords:
+            # Keep the best (lowest) rank if a keyword appears twice
+            if _kw not in _AC or _AC.get(_kw)[0] > _rank:
+                _AC.add_word(_kw, (_rank, _category))
+    _AC.make_automaton()
+except ImportError:
+    _AC = None
+
+
 def _heuristic_classify(text: str) -> dict:
     text_lower = text.lower()
 
-    heuristics = [
-        (["write a skill", "create a skill", "new skill", "new tool"],   "skill_writing"),
-        (["debug", "fix this", "error:", "traceback", "exception"],      "debugging"),
-        (["def ", "class ", "function", "import ", "#!/"],               "coding"),
-        (["bash", "shell", "terminal", "sudo", "apt", "pip install"],    "shell_command"),
-        (["math", "calculate", "equation", "integral", "proof"],         "math"),
-        (["search for", "look up", "what is the latest", "current"],     "web_search"),
-        (["summarize", "tldr", "summary of"],                            "summarization"),
-        (["translate", "in french", "in spanish", "in german"],          "translation"),
-        (["plan", "schedule", "roadmap", "steps to"],                    "planning"),
-        (["analyze", "csv", "dataframe", "dataset", "statistics"],       "data_analysis"),
-        (["write a story", "write a poem", "creative"],                  "creative_writing"),
-        (["screenshot", "what's on screen", "capture screen"],           "screenshot_analysis"),
-        (["image", "photo", "picture", "describe this"],                 "image_description"),
-        (["research", "investigate", "deep dive", "comprehensive"],      "research"),
-    ]
-
-    for keywords, category in heuristics:
-        if any(kw in text_lower for kw in keywords):
-            return {"category": category, "confidence": 0.6, "subtask": text[:60]}
+    category = None
+    if _AC is not None:
+        best = min((hit for _, hit in _AC.iter(text_lower)), default=None)
+        if best:
+            category = best[1]
+    else:
+        category = next(
+            (cat for keywords, cat in HEURISTICS if any(kw in text_lower for kw in keywords)),
+            None,
+        )
+
+    if category:
+        return {"category": category, "confidence": 0.6, "subtask": text[:60]}
 
     return {"category": "general_chat", "confidence": 0.5, "subtask": text[:60]}
@@ -7,9 +7,16 @@ Handles DeepSeek-R1 <think> blocks, skill calls, fallback chains, and OOM recove
 import ollama
 import json
 import re
+import reprlib
 import time
 from typing import Callable, Optional
 
+try:
+    import orjson
+    _loads = orjson.loads  # Raises a json.JSONDecodeError subclass, like json
+except ImportError:
+    _loads = json.loads
+
 TOOL_USE_SYSTEM = """{system}"""
 
 TOOL_USE_PROMPT = """Task: {prompt}
@@ -20,6 +27,55 @@ Remember:
 - Output FINAL: <answer> when complete
 - Never give up — try different approaches if one fails
 """
+# Static halves of TOOL_USE_PROMPT — concatenated per call instead of re-parsing the template
+_TASK_PREFIX, _TASK_SUFFIX = TOOL_USE_PROMPT.format(prompt="\0").split("\0")
+
+_SKILL_MSG_PREFIX = "Skill result:\n"
+_SKILL_MSG_SUFFIX = "\n\nContinue. Use more skills or output FINAL: when done."
+
+# Model output markers — compiled once, matched every tool round
+_THINK_RE      = re.compile(r"<think>(.*?)</think>", re.DOTALL)
+_SKILL_RE      = re.compile(r"SKILL:\s*(\{.*?\})", re.DOTALL)
+_SKILL_LINE_RE = re.compile(r"^SKILL:.*$", re.MULTILINE)
+_json_decoder  = json.JSONDecoder()
+
+
+def _skill_json(reply: str) -> Optional[str]:
+    """The JSON object after the first SKILL:, or None. The decoder finds
+    where the object ends, so nested args ({"args": {...}}) come through
+    whole — the lazy regex stops at the first "}". Malformed JSON falls
+    back to the regex span so the model still gets the parse error."""
+    idx = reply.find("SKILL:")
+    if idx == -1:
+        return None
+    start = idx + 6
+    brace = reply.find("{", start)
+    if brace != -1 and not reply[start:brace].strip():
+        try:
+            _, end = _json_decoder.raw_decode(reply, brace)
+            return reply[brace:end]
+        except json.JSONDecodeError:
+            pass
+    match = _SKILL_RE.search(reply, idx)
+    return match.group(1) if match else None
+
+
+# model → layer count to offload. A concrete count keeps Ollama's offload plan
+# stable between calls; num_gpu=999 made it re-resolve "max layers" each time.
+_gpu_layers: dict = {}
+
+
+def _num_gpu_layers(model: str) -> Optional[int]:
+    """All layers of the model (repeating blocks + output), or None if unknown."""
+    if model not in _gpu_layers:
+        try:
+            resp = ollama.show(model)
+            info = getattr(resp, "modelinfo", None) or resp.get("model_info") or {}
+            blocks = next((v for k, v in info.items() if k.endswith(".block_count")), None)
+            _gpu_layers[model] = blocks + 1 if blocks else None
+        except Exception:
+            _gpu_layers[model] = None
+    return _gpu_layers[model]
 
 
 def execute_task(
@@ -38,13 +94,23 @@ def execute_task(
     Returns result dict with output, success, tool_calls, model keys.
     """
     messages = [
-        {"role": "user", "content": TOOL_USE_PROMPT.format(prompt=prompt)}
+        {"role": "user", "content": _TASK_PREFIX + prompt + _TASK_SUFFIX}
     ]
 
     tool_calls = 0
+    nudge_count = 0  # "Continue." nudges sent so far
     last_reply = ""
     thinking_log = []
 
+    options = {
+        "temperature": 0.7,
+        "num_predict": token_budget,
+        "num_ctx": 8192,
+    }
+    num_gpu = _num_gpu_layers(model)
+    if num_gpu:
+        options["num_gpu"] = num_gpu  # Every layer, as a fixed count
+
     while tool_calls < max_tool_calls:
         try:
             t0 = time.time()
@@ -52,12 +118,7 @@ def execute_task(
                 model=model,
                 messages=messages,
                 system=system,
-                options={
-                    "temperature": 0.7,
-                    "num_predict": token_budget,
-                    "num_ctx": 8192,
-                    "num_gpu": 999,  # Ollama caps to available; maximises GPU layers
-                }
+                options=options,
             )
             elapsed = time.time() - t0
 
@@ -78,7 +139,7 @@ def execute_task(
         last_reply = raw_reply
 
         # ── DeepSeek-R1 <think> block handling ──
-        think_match = re.search(r"<think>(.*?)</think>", raw_reply, re.DOTALL)
+        think_match = _THINK_RE.search(raw_reply) if "<think>" in raw_reply else None
         reply = raw_reply
         if think_match:
             think_text = think_match.group(1).strip()
@@ -92,9 +153,9 @@ def execute_task(
         print(f"  [dim]{elapsed:.1f}s | {len(reply)} chars[/dim]")
 
         # ── Check for FINAL answer ──
-        final_match = re.search(r"FINAL:\s*(.*)", reply, re.DOTALL)
-        if final_match:
-            final_output = final_match.group(1).strip()
+        final_at = reply.find("FINAL:")
+        if final_at != -1:
+            final_output = reply[final_at + 6:].strip()
             return {
                 "output": final_output,
                 "success": True,
@@ -104,20 +165,19 @@ def execute_task(
             }
 
         # ── Check for SKILL call ──
-        skill_match = re.search(r"SKILL:\s*(\{.*?\})", reply, re.DOTALL)
-        if skill_match:
+        skill_json = _skill_json(reply)
+        if skill_json:
             skill_result = _handle_skill_call(
-                skill_match.group(1), skills, on_skill_call, on_skill_result
+                skill_json, skills, on_skill_call, on_skill_result
             )
             messages.append({
                 "role": "user",
-                "content": f"Skill result:\n{skill_result}\n\nContinue. Use more skills or output FINAL: when done."
+                "content": _SKILL_MSG_PREFIX + skill_result + _SKILL_MSG_SUFFIX,
             })
             tool_calls += 1
             continue
 
         # ── No FINAL or SKILL — nudge the model ──
-        nudge_count = sum(1 for m in messages if m.get("content", "").startswith("Continue."))
         if nudge_count >= 3:
             # Model is stuck — force a final
             messages.append({
@@ -132,6 +192,7 @@ def execute_task(
                 "role": "user",
                 "content": "Continue. Use a SKILL if you need information, or output FINAL: when done."
             })
+            nudge_count += 1
 
     # Max tool calls reached — return what we have
     return {
@@ -151,7 +212,7 @@ def _handle_skill_call(
     on_skill_result: Optional[Callable],
 ) -> str:
     try:
-        skill_call = json.loads(json_str)
+        skill_call = _loads(json_str)
         skill_name = skill_call.get("name", "")
         skill_args = skill_call.get("args", {})
 
@@ -159,11 +220,7 @@ def _handle_skill_call(
             on_skill_call(skill_name, skill_args)
 
         result = skills.run(skill_name, **skill_args)
-        result_str = str(result)
-
-        # Trim massive outputs to avoid blowing context window
-        if len(result_str) > 6000:
-            result_str = result_str[:5700] + f"\n... [truncated, {len(result_str)} total chars]"
+        result_str = _result_text(result)
 
         if on_skill_result:
             on_skill_result(skill_name, result_str)
@@ -178,10 +235,36 @@ def _handle_skill_call(
         return f"ERROR in skill execution: {e}. Try a different approach."
 
 
+# Skill output budget for the context window
+MAX_RESULT_CHARS = 6000
+
+# Bounded repr for container results: never walks more items than fit
+_result_repr = reprlib.Repr()
+_result_repr.maxlevel = 4
+_result_repr.maxlist = _result_repr.maxtuple = _result_repr.maxset = 200
+_result_repr.maxdict = 100
+_result_repr.maxstring = 1500
+_result_repr.maxother = 1500
+
+
+def _result_text(result) -> str:
+    """Skill result as text, trimmed to avoid blowing the context window.
+    Large lists/dicts are abbreviated while being rendered, not after."""
+    if isinstance(result, (list, tuple, dict, set)):
+        text = _result_repr.repr(result)
+        if len(text) > MAX_RESULT_CHARS:
+            text = text[:MAX_RESULT_CHARS - 300] + "\n... [truncated]"
+        return text
+    text = str(result)
+    if len(text) > MAX_RESULT_CHARS:
+        text = text[:MAX_RESULT_CHARS - 300] + f"\n... [truncated, {len(text)} total chars]"
+    return text
+
+
 def _extract_best_output(reply: str) -> str:
     """Pull the most useful content from a reply that didn't have FINAL:"""
     # Remove think blocks
-    reply = re.sub(r"<think>.*?</think>", "", reply, flags=re.DOTALL).strip()
+    reply = _THINK_RE.sub("", reply).strip()
     # Remove SKILL: lines
-    reply = re.sub(r"^SKILL:.*$", "", reply, flags=re.MULTILINE).strip()
+    reply = _SKILL_LINE_RE.sub("", reply).strip()
     return reply or "No output generated."
@@ -3,15 +3,17 @@ core/fast_classifier.py — Sub-millisecond heuristic classifier.
 Falls back to general_chat for ambiguous messages rather than mis-routing.
 """
 import re
+import sys
+from functools import lru_cache
 
 # Specific programming languages and tools — rarely ambiguous
-CODING_WORDS = {
+CODING_WORDS = frozenset({
     "python", "javascript", "typescript", "golang", "rust", "kotlin",
     "dockerfile", "kubernetes", "terraform", "webpack", "pytest",
     "async", "await", "recursion", "algorithm", "refactor",
     "middleware", "endpoint", "webhook", "api", "json", "yaml",
     "regex", "stdlib", "virtualenv", "dependencies",
-}
+})
 
 # Code syntax phrases — unambiguous
 CODING_PHRASES = [
@@ -22,23 +24,23 @@ CODING_PHRASES = [
     "npm install", "pip install", "git clone", "git commit",
 ]
 
-SEARCH_WORDS = {
+SEARCH_WORDS = frozenset({
     "search", "google", "latest", "news", "current", "price",
     "weather", "stock", "define", "meaning", "translate",
     "who is", "what is", "when did", "where is",
-}
+})
 
-TASK_WORDS = {
+TASK_WORDS = frozenset({
     "create", "build", "generate", "plan", "schedule",
     "remind", "task", "todo", "draft", "summarize", "analyse", "analyze",
-}
+})
 
-MATH_WORDS = {
+MATH_WORDS = frozenset({
     "calculate", "solve", "equation", "formula", "compute", "integral",
     "derivative", "probability", "statistics", "percentage", "convert",
-}
+})
 
-CREATIVE_WORDS = {"poem", "story", "fiction", "imagine", "invent", "creative"}
+CREATIVE_WORDS = frozenset({"poem", "story", "fiction", "imagine", "invent", "creative"})
 
 # Messages that are conversational — skip expensive routing
 CHAT_PHRASES = [
@@ -51,51 +53,74 @@ CHAT_PHRASES = [
 ]
 
 
+DEBUG_HINTS = ["error", "bug", "fix", "broken", "crash", "fail", "traceback", "exception"]
+
+
+def _words_re(words) -> "re.Pattern":
+    """One whole-word alternation, so each category is a single C-level scan.
+    Longest first so multi-word entries ("who is") win over their prefixes."""
+    alts = sorted((re.escape(w) for w in words), key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(alts) + r")\b")
+
+
+def _phrases_re(phrases) -> "re.Pattern":
+    """Plain substring alternation — same as any(p in msg for p in phrases)."""
+    return re.compile("|".join(re.escape(p) for p in phrases))
+
+
+# Words that make a short message topical rather than chit-chat
+_NONCHAT_WORDS = CODING_WORDS | MATH_WORDS | SEARCH_WORDS
+
+_CODING_RE        = _words_re(CODING_WORDS)
+_SEARCH_RE        = _words_re(SEARCH_WORDS)
+_TASK_RE          = _words_re(TASK_WORDS)
+_MATH_RE          = _words_re(MATH_WORDS)
+_CREATIVE_RE      = _words_re(CREATIVE_WORDS)
+_SHORT_TOPICAL_RE = _words_re(_NONCHAT_WORDS)
+_CHAT_RE          = _phrases_re(CHAT_PHRASES)
+_CODING_PHRASE_RE = _phrases_re(CODING_PHRASES)
+_DEBUG_RE         = _phrases_re(DEBUG_HINTS)
+
+
+# Interned so downstream category comparisons hit the identity fast path
+(GENERAL_CHAT, CODING, DEBUGGING, MATH, WEB_SEARCH, PLANNING, CREATIVE_WRITING) = map(sys.intern, (
+    "general_chat", "coding", "debugging", "math", "web_search", "planning", "creative_writing",
+))
+
 def fast_classify(message: str) -> dict:
-    msg = message.lower().strip()
-    words = set(re.findall(r'\b\w+\b', msg))
+    category, confidence, needs_tools, source = _classify(message.lower().strip())
+    return {"category": category, "confidence": confidence,
+            "needs_tools": needs_tools, "rewritten": message,
+            "facts": [], "_source": source}
 
+
+@lru_cache(maxsize=256)
+def _classify(msg: str) -> tuple:
+    """(category, confidence, needs_tools, source) for a lowercased message.
+    Cached as an immutable tuple; fast_classify builds a fresh dict per call."""
     # Conversational phrases — always general chat
-    if any(p in msg for p in CHAT_PHRASES):
-        return {"category": "general_chat", "confidence": 0.95,
-                "needs_tools": False, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
+    if _CHAT_RE.search(msg):
+        return GENERAL_CHAT, 0.95, False, "heuristic"
 
     # Very short messages are conversational
-    if len(msg) < 30 and not words & (CODING_WORDS | MATH_WORDS | SEARCH_WORDS):
-        return {"category": "general_chat", "confidence": 0.95,
-                "needs_tools": False, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
+    if len(msg) < 30 and not _SHORT_TOPICAL_RE.search(msg):
+        return GENERAL_CHAT, 0.95, False, "heuristic"
 
     # Coding — require explicit language names OR actual code syntax phrases
-    if words & CODING_WORDS or any(p in msg for p in CODING_PHRASES):
-        cat = "debugging" if any(p in msg for p in [
-            "error", "bug", "fix", "broken", "crash", "fail", "traceback", "exception"
-        ]) else "coding"
-        return {"category": cat, "confidence": 0.9,
-                "needs_tools": False, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
-
-    if words & MATH_WORDS:
-        return {"category": "math", "confidence": 0.9,
-                "needs_tools": False, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
-
-    if words & SEARCH_WORDS:
-        return {"category": "web_search", "confidence": 0.85,
-                "needs_tools": True, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
-
-    if words & TASK_WORDS:
-        return {"category": "planning", "confidence": 0.8,
-                "needs_tools": False, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
-
-    if words & CREATIVE_WORDS:
-        return {"category": "creative_writing", "confidence": 0.85,
-                "needs_tools": False, "rewritten": message,
-                "facts": [], "_source": "heuristic"}
-
-    return {"category": "general_chat", "confidence": 0.7,
-            "needs_tools": False, "rewritten": message,
-            "facts": [], "_source": "heuristic_default"}
+    if _CODING_RE.search(msg) or _CODING_PHRASE_RE.search(msg):
+        cat = DEBUGGING if _DEBUG_RE.search(msg) else CODING
+        return cat, 0.9, False, "heuristic"
+
+    if _MATH_RE.search(msg):
+        return MATH, 0.9, False, "heuristic"
+
+    if _SEARCH_RE.search(msg):
+        return WEB_SEARCH, 0.85, True, "heuristic"
+
+    if _TASK_RE.search(msg):
+        return PLANNING, 0.8, False, "heuristic"
+
+    if _CREATIVE_RE.search(msg):
+        return CREATIVE_WRITING, 0.85, False, "heuristic"
+
+    return GENERAL_CHAT, 0.7, False, "heuristic_default"
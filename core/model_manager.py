@@ -16,14 +16,26 @@ leaving 7B/14B free for the user.
 import asyncio
 import ollama
 import time
+from collections import defaultdict
+from functools import lru_cache
+from operator import methodcaller
 from typing import Optional
 
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("cl100k_base")
+except Exception:  # Not installed, or the encoding can't be fetched offline
+    _ENC = None
+
 # Models that can signal escalation to a larger model
 ESCALATION_SIGNAL = "ESCALATE:"
 
 # How long to keep a model warm after last use (seconds)
 KEEPALIVE_TTL = 8 * 60  # 8 minutes
 
+# Pooled connection to the local Ollama server
+_client = ollama.Client()
+
 # Ping payload — minimal tokens to keep model loaded
 KEEPALIVE_PROMPT = "."
 
@@ -33,37 +45,50 @@ class ModelManager:
     Tracks model usage and keeps recently-used models warm via background pings.
     """
     def __init__(self):
+        # Monotonic timestamps, so wall-clock jumps can't re-trigger pings
         self._last_used: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
         self._keepalive_task: Optional[asyncio.Task] = None
 
     def record_use(self, model: str):
-        self._last_used[model] = time.time()
+        self._last_used[model] = time.monotonic()
 
     def is_warm(self, model: str) -> bool:
-        last = self._last_used.get(model, 0)
-        return (time.time() - last) < KEEPALIVE_TTL
+        last = self._last_used.get(model)
+        return last is not None and (time.monotonic() - last) < KEEPALIVE_TTL
 
     async def start_keepalive_loop(self):
         """Run as an asyncio background task alongside heartbeat."""
         while True:
             await asyncio.sleep(60)  # Check every minute
-            now = time.time()
-            for model, last_used in list(self._last_used.items()):
-                age = now - last_used
-                # Ping if model was used recently and is approaching TTL expiry
-                if 0 < age < KEEPALIVE_TTL and age > (KEEPALIVE_TTL - 90):
-                    await self._ping(model)
+            now = time.monotonic()
+            # Ping if model was used recently and is approaching TTL expiry
+            due = [
+                model for model, last_used in list(self._last_used.items())
+                if KEEPALIVE_TTL - 90 < now - last_used < KEEPALIVE_TTL
+            ]
+            if due:
+                # Concurrently, so one slow ping doesn't push the others past expiry
+                await asyncio.gather(*(self._ping_guarded(m) for m in due))
+
+    async def _ping_guarded(self, model: str):
+        """One ping per model at a time; skip if one is already in flight."""
+        lock = self._locks[model]
+        if lock.locked():
+            return
+        async with lock:
+            await self._ping(model)
 
     async def _ping(self, model: str):
         """Send a minimal prompt to keep the model loaded in Ollama."""
         try:
             await asyncio.to_thread(
-                ollama.generate,
+                _client.generate,
                 model=model,
                 prompt=KEEPALIVE_PROMPT,
                 options={"num_predict": 1, "num_ctx": 64},
             )
-            self._last_used[model] = time.time()
+            self._last_used[model] = time.monotonic()
             print(f"[MODEL_MGR] Keepalive ping sent to {model}")
         except Exception as e:
             print(f"[MODEL_MGR] Keepalive ping failed for {model}: {e}")
@@ -81,19 +106,25 @@ ESCALATION_MAP = {
 }
 
 # Categories that ALWAYS go to 14B (skip 8B-first)
-ALWAYS_14B = {
+ALWAYS_14B = frozenset({
     "skill_writing",   # needs perfect code
     "error_recovery",  # critical correctness
-}
+})
 
 # Categories that NEVER need 14B (stay on 3B/8B)
-NEVER_14B = {
+NEVER_14B = frozenset({
     "general_chat",
     "summarization",
     "translation",
     "sentiment_analysis",
     "structured_output",
-}
+})
+
+# Remaining routing groups, checked in order by get_model_for_category
+_CODE_CATS     = frozenset({"coding", "debugging", "shell_command", "math", "reasoning"})
+_RESEARCH_CATS = frozenset({"research", "planning", "data_analysis", "agentic_task"})
+_TOOL_CATS     = frozenset({"web_search", "task_management", "file_management"})
+_CREATIVE_CATS = frozenset({"creative_writing", "image_description"})
 
 ESCALATION_SYSTEM_ADDENDUM = """
 IMPORTANT: If this task genuinely requires capabilities beyond what you have,
@@ -113,7 +144,7 @@ def get_model_for_category(category: str, needs_tools: bool) -> dict:
     if category in NEVER_14B:
         return {"model": "llama3.2:3b", "escalation_target": None, "tier": "3b"}
 
-    if category in ("coding", "debugging", "shell_command", "math", "reasoning"):
+    if category in _CODE_CATS:
         # Try 8B coder first — escalate to 14B only if it asks
         return {
             "model": "qwen2.5-coder:7b",
@@ -121,17 +152,17 @@ def get_model_for_category(category: str, needs_tools: bool) -> dict:
             "tier": "8b_with_escalation",
         }
 
-    if category in ("research", "planning", "data_analysis", "agentic_task"):
+    if category in _RESEARCH_CATS:
         return {
             "model": "llama3.1:8b",
             "escalation_target": "qwen2.5:14b",
             "tier": "8b_with_escalation",
         }
 
-    if category in ("web_search", "task_management", "file_management"):
+    if category in _TOOL_CATS:
         return {"model": "llama3.1:8b", "escalation_target": None, "tier": "8b"}
 
-    if category in ("creative_writing", "image_description"):
+    if category in _CREATIVE_CATS:
         return {"model": "llama3.2:3b", "escalation_target": "llama3.1:8b", "tier": "3b_with_escalation"}
 
     # Default
@@ -140,9 +171,11 @@ def get_model_for_category(category: str, needs_tools: bool) -> dict:
 
 def check_for_escalation(response_text: str) -> Optional[str]:
     """Returns escalation reason if model is asking for a bigger model, else None."""
-    import re
-    m = re.search(r"ESCALATE:\s*(.+)", response_text)
-    return m.group(1).strip() if m else None
+    _, sep, tail = response_text.partition(ESCALATION_SIGNAL)
+    if not sep:
+        return None
+    line, _, _ = tail.lstrip().partition("\n")
+    return line.strip() or None
 
 
 # ── Background model policy ───────────────────────────────────────────────────
@@ -195,45 +228,144 @@ SUMMARY_THRESHOLD = 5500  # tokens — compress history when we hit this
 
 
 def estimate_tokens(text: str) -> int:
-    return max(1, len(text) // 4)
+    return _count(text)
+
+
+@lru_cache(maxsize=4096)
+def _count(text: str) -> int:
+    """Token count for one message body. Cached by content, so unchanged
+    history turns are a hash lookup on every later pass."""
+    if not text:
+        return 1
+    if _ENC is not None:
+        return max(1, len(_ENC.encode(text, disallowed_special=())))
+    return max(1, len(text) // 4)  # Rough fallback: ~4 chars per token
+
 
+_CONTENT = methodcaller("get", "content", "")
 
-def maybe_summarise_history(messages: list, model_manager=None) -> list:
+KEEP_RECENT_FRACTION = 0.3  # Share of the tier's context kept verbatim at the tail
+_SERIALIZATION_BUDGET = 1500  # chars for the whole summary body
+_VERBATIM_BUDGET = 800        # of which, chars for high-importance messages kept whole
+
+
+def maybe_summarise_history(messages: list, tier: str = "8b", model_manager=None) -> list:
     """
     If conversation history is getting long, compress the middle.
-    Keeps the first message (original task) and last 2 exchanges intact.
-    Middle is replaced with a compact summary.
+    Keeps the first message (original task) and as many recent messages as
+    fit in KEEP_RECENT_FRACTION of the tier's context; the rest is summarised.
+    Compresses the list in place (and returns it) rather than copying it.
     """
-    total = sum(estimate_tokens(m.get("content", "")) for m in messages)
-    if total < SUMMARY_THRESHOLD:
-        return messages  # Fine as-is
-
-    if len(messages) < 6:
+    if len(messages) < 3:
         return messages  # Too short to compress
 
-    # Keep first 1 and last 4 messages, summarise the middle
-    first = messages[:1]
-    middle = messages[1:-4]
-    last = messages[-4:]
+    toks = list(map(_count, map(_CONTENT, messages)))
+    total = sum(toks)
+    if total < SUMMARY_THRESHOLD:
+        return messages  # Fine as-is
 
+    # Walk back from the newest message until the recent-token budget is spent
+    keep_recent = int(KEEP_RECENT_FRACTION * get_num_ctx(tier))
+    split, acc = 1, 0
+    for i in range(len(messages) - 1, 0, -1):
+        acc += toks[i]
+        if acc > keep_recent:
+            split = i + 1
+            break
+    # Always keep the latest message, and don't open the tail on a tool
+    # result whose assistant call went into the summary
+    split = min(split, len(messages) - 1)
+    while split < len(messages) - 1 and messages[split].get("role") == "tool":
+        split += 1
+
+    middle = messages[1:split]
     if not middle:
         return messages
 
-    middle_text = "\n".join([
-        f"{m['role'].upper()}: {m['content'][:200]}"
-        for m in middle
-    ])
+    middle_text = _serialize_middle(middle)
 
     summary_msg = {
         "role": "user",
         "content": (
             f"[HISTORY SUMMARY — {len(middle)} earlier messages compressed]\n"
-            f"Key actions taken so far:\n{middle_text[:800]}\n"
+            f"Key actions taken so far:\n{middle_text}\n"
             f"[End of summary. Continuing from most recent exchange below.]"
         )
     }
 
-    compressed = first + [summary_msg] + last
-    new_total = sum(estimate_tokens(m.get("content", "")) for m in compressed)
-    print(f"[CTX] History compressed: {total} → {new_total} tokens ({len(messages)} → {len(compressed)} messages)")
-    return compressed
+    new_total = toks[0] + estimate_tokens(summary_msg["content"]) + sum(toks[split:])
+    n_before = len(messages)
+    messages[1:split] = [summary_msg]
+    print(f"[CTX] History compressed: {total} → {new_total} tokens ({n_before} → {len(messages)} messages)")
+    return messages
+
+
+def _serialize_msg_full(m: dict) -> str:
+    return f"{m['role'].upper()}: {(m.get('content') or '')[:400]}"
+
+
+def _serialize_msg_compact(m: dict) -> str:
+    content = m.get("content") or ""
+    if m.get("role") == "tool":
+        return f"TOOL: {content[:80]} (tool result {estimate_tokens(content)} tokens)"
+    return f"{m['role'].upper()}: {content[:80]}"
+
+
+_ERROR_HINTS    = ("error", "traceback", "exception", "failed")
+_DECISION_HINTS = ("decided", "fixed")
+
+
+def _score(m: dict) -> float:
+    """Rough importance: tool results, errors and decisions outlive trivia."""
+    content = (m.get("content") or "").lower()
+    return (
+        0.4 * (m.get("role") == "tool")
+        + 0.3 * any(h in content for h in _ERROR_HINTS)
+        + 0.2 * any(h in content for h in _DECISION_HINTS)
+    )
+
+
+def _select_verbatim(middle: list) -> set:
+    """Indices of middle messages to keep whole: best importance per char first."""
+    scored = []
+    for i, m in enumerate(middle):
+        score = _score(m)
+        if score:
+            scored.append((score / max(1, len(m.get("content") or "")), i))
+    keep, used = set(), 0
+    for _, i in sorted(scored, reverse=True):
+        size = len(middle[i].get("content") or "")
+        if used + size <= _VERBATIM_BUDGET:
+            keep.add(i)
+            used += size
+    return keep
+
+
+def _serialize_middle(middle: list) -> str:
+    """Important messages verbatim; otherwise newest 30% of the span in full
+    and older 70% as one-liners. Oldest non-verbatim entries are dropped
+    first to stay within the budget. Original order is preserved."""
+    keep = _select_verbatim(middle)
+    full_from = len(middle) - max(1, int(len(middle) * 0.3))
+    lines = []
+    for i, m in enumerate(middle):
+        if i in keep:
+            lines.append((True, f"{m['role'].upper()}: {m.get('content') or ''}"))
+        elif i >= full_from:
+            lines.append((False, _serialize_msg_full(m)))
+        else:
+            lines.append((False, _serialize_msg_compact(m)))
+
+    size = sum(len(line) + 1 for _, line in lines)
+    dropped = 0
+    for i, (kept, line) in enumerate(lines):
+        if size <= _SERIALIZATION_BUDGET:
+            break
+        if not kept and i < len(lines) - 1:
+            size -= len(line) + 1
+            lines[i] = (kept, None)
+            dropped += 1
+    text = "\n".join(line for _, line in lines if line is not None)[:_SERIALIZATION_BUDGET]
+    if dropped:
+        text = f"({dropped} older messages summarised away)\n" + text
+    return text
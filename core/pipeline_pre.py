@@ -15,10 +15,24 @@ After:  1 call, one JSON blob, 1.0 - 1.8s.
 Saving: ~2-3s per message, every message, forever.
 """
 
+import asyncio
 import json
+from contextvars import ContextVar
 import ollama
 import re
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, Optional
+
+from core.model_manager import get_model_for_category
+
+try:
+    import orjson
+    _loads = orjson.loads  # Raises a json.JSONDecodeError subclass, like json
+except ImportError:
+    _loads = json.loads
+
+# Pooled connection to the local Ollama server
+_client = ollama.Client()
 
 CATEGORIES = [
     "general_chat", "coding", "debugging", "math", "reasoning",
@@ -27,6 +41,7 @@ CATEGORIES = [
     "image_description", "screenshot_analysis", "task_management",
     "research", "skill_writing", "agentic_task", "error_recovery",
 ]
+_CATEGORY_SET = frozenset(CATEGORIES)
 
 FACT_CATEGORIES = [
     "name", "location", "occupation", "interests", "family",
@@ -59,111 +74,227 @@ Return ONLY this JSON (no markdown, no explanation):
 
 facts array: only include if the message explicitly states something about the user (name, job, location, etc). Empty array [] if nothing extractable."""
 
+# The prompt around {input} never changes — format it once
+_PROMPT_HEAD, _PROMPT_TAIL = MERGED_PRE_PROMPT.format(
+    categories=", ".join(CATEGORIES),
+    fact_cats="|".join(FACT_CATEGORIES),
+    input="\0",
+).split("\0")
+
+# Compiled once — run on every message before the first token is shown
+_FENCE_RE = re.compile(r"```json?\s*|\s*```")
+_JSON_RE  = re.compile(r"\{.*\}", re.DOTALL)
+
 
 def run_pre_pipeline(user_message: str) -> dict:
     """
     Single 0.5b call replacing classify + rewrite + extract.
     Returns dict with: category, confidence, needs_tools, rewritten, facts
     """
-    # Very short messages don't need rewriting or extraction
-    skip_heavy = len(user_message.split()) < 4
+    return _with_fallback(_llm_pre, user_message)
+
+
+def _llm_pre(user_message: str) -> dict:
+    """The merged model call. Errors (including a reply with no valid JSON)
+    propagate, so a cached wrapper never holds on to a failure."""
+    resp = _client.generate(
+        model="qwen2.5:0.5b",
+        prompt=_PROMPT_HEAD + user_message[:400] + _PROMPT_TAIL,
+        options={"temperature": 0.1, "num_predict": 150, "num_ctx": 1024}
+    )
+    text = resp["response"].strip()
+
+    # Extract JSON — handle markdown fences if model adds them
+    text = _FENCE_RE.sub("", text)
+    match = _JSON_RE.search(text)
+    if not match:
+        raise ValueError("no JSON object in pre-pipeline reply")
+    result = _loads(match.group())
+
+    # Validate category
+    if result.get("category") not in _CATEGORY_SET:
+        result["category"] = _heuristic_category(user_message)
+
+    # Ensure rewritten is sane
+    rewritten = result.get("rewritten", "").strip()
+    if not rewritten or len(rewritten) > len(user_message) * 5:
+        result["rewritten"] = user_message
+
+    # Ensure facts is a list
+    if not isinstance(result.get("facts"), list):
+        result["facts"] = []
+
+    result["_source"] = "llm"
+    return result
+
 
+def _with_fallback(llm, user_message: str) -> dict:
+    """llm(user_message), or the heuristic result if the call fails."""
     try:
-        resp = ollama.generate(
-            model="qwen2.5:0.5b",
-            prompt=MERGED_PRE_PROMPT.format(
-                categories=", ".join(CATEGORIES),
-                fact_cats="|".join(FACT_CATEGORIES),
-                input=user_message[:400],
-            ),
-            options={"temperature": 0.1, "num_predict": 150, "num_ctx": 1024}
-        )
-        text = resp["response"].strip()
-
-        # Extract JSON — handle markdown fences if model adds them
-        text = re.sub(r"```json?\s*|\s*```", "", text)
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if match:
-            result = json.loads(match.group())
-
-            # Validate category
-            if result.get("category") not in CATEGORIES:
-                result["category"] = _heuristic_category(user_message)
-
-            # Ensure rewritten is sane
-            rewritten = result.get("rewritten", "").strip()
-            if not rewritten or len(rewritten) > len(user_message) * 5:
-                result["rewritten"] = user_message
-
-            # Ensure facts is a list
-            if not isinstance(result.get("facts"), list):
-                result["facts"] = []
-
-            result["_source"] = "llm"
-            return result
-
-    except (json.JSONDecodeError, Exception):
-        pass
-
-    # Heuristic fallback — no LLM needed
+        return llm(user_message)
+    except ValueError:
+        pass  # Unparseable reply (json and orjson errors are ValueErrors)
+    except Exception as e:
+        print(f"[PRE] Pre-pipeline call failed: {e}")
+
+    return _heuristic_pre(user_message)
+
+
+def _heuristic_pre(user_message: str) -> dict:
+    """Heuristic fallback — no LLM needed."""
+    category, needs_tools = _classify_heuristic(user_message[:HEURISTIC_HEAD_CHARS])
     return {
-        "category":    _heuristic_category(user_message),
+        "category":    category,
         "confidence":  0.5,
-        "needs_tools": _needs_tools(user_message),
+        "needs_tools": needs_tools,
         "rewritten":   user_message,
         "facts":       [],
         "_source":     "heuristic",
     }
 
 
-def _heuristic_category(text: str) -> str:
-    t = text.lower()
-    rules = [
-        (["write a skill", "new skill", "new tool", "create a skill"],     "skill_writing"),
-        (["debug", "fix this", "fix the", "error:", "traceback", "exception"], "debugging"),
-        (["write a ", "create a ", "build a ", "implement "],              "coding"),
-        (["def ", "class ", "function(", "import "],                       "coding"),
-        (["bash", "shell", "sudo ", "apt ", "pip install", "systemctl"],   "shell_command"),
-        (["calculate", "solve", "integral", "derivative", "equation"],     "math"),
-        (["search for", "look up", "find me", "what is the latest"],       "web_search"),
-        (["summarize", "tldr", "summary", "shorten"],                      "summarization"),
-        (["translate", "in french", "in spanish", "in german"],            "translation"),
-        (["plan", "schedule", "roadmap", "steps to", "how do i"],          "planning"),
-        (["research", "investigate", "deep dive", "tell me everything"],   "research"),
-        (["screenshot", "what's on screen", "what do you see"],            "screenshot_analysis"),
-        (["analyze", ".csv", "dataframe", "dataset", "graph"],             "data_analysis"),
-    ]
-    for keywords, category in rules:
+HEURISTIC_RULES = [
+    (["write a skill", "new skill", "new tool", "create a skill"],     "skill_writing"),
+    (["debug", "fix this", "fix the", "error:", "traceback", "exception"], "debugging"),
+    (["write a ", "create a ", "build a ", "implement "],              "coding"),
+    (["def ", "class ", "function(", "import "],                       "coding"),
+    (["bash", "shell", "sudo ", "apt ", "pip install", "systemctl"],   "shell_command"),
+    (["calculate", "solve", "integral", "derivative", "equation"],     "math"),
+    (["search for", "look up", "find me", "what is the latest"],       "web_search"),
+    (["summarize", "tldr", "summary", "shorten"],                      "summarization"),
+    (["translate", "in french", "in spanish", "in german"],            "translation"),
+    (["plan", "schedule", "roadmap", "steps to", "how do i"],          "planning"),
+    (["research", "investigate", "deep dive", "tell me everything"],   "research"),
+    (["screenshot", "what's on screen", "what do you see"],            "screenshot_analysis"),
+    (["analyze", ".csv", "dataframe", "dataset", "graph"],             "data_analysis"),
+]
+
+# Same single-pass matching as core.classifier; falls back to the rule loop
+try:
+    import ahocorasick
+    _RULES_AC = ahocorasick.Automaton()
+    for _rank, (_keywords, _category) in enumerate(HEURISTIC_RULES):
+        for _kw in _keywords:
+            if _kw not in _RULES_AC or _RULES_AC.get(_kw)[0] > _rank:
+                _RULES_AC.add_word(_kw, (_rank, _category))
+    _RULES_AC.make_automaton()
+except ImportError:
+    _RULES_AC = None
+
+
+PRE_DEADLINE = 3.0  # Seconds run_pre_pipeline_async waits before using the heuristic
+
+
+def _default_route(category: str, needs_tools: bool) -> str:
+    return get_model_for_category(category, needs_tools)["model"]
+
+
+async def run_pre_pipeline_async(user_message: str,
+                                 route: Optional[Callable[[str, bool], str]] = None,
+                                 guess: Optional[tuple] = None) -> dict:
+    """
+    run_pre_pipeline off the event loop, overlapped with a speculative warm-up
+    of the model the heuristic category routes to (guess, or this module's
+    heuristic). route maps (category, needs_tools) to a model name. If the LLM
+    disagrees, the model for its category is warmed as well. Past PRE_DEADLINE
+    the heuristic result is returned instead. Returns the same dict.
+    """
+    route = route or _default_route
+    pre_task = asyncio.create_task(asyncio.to_thread(run_pre_pipeline, user_message))
+    category, needs_tools = guess or _classify_heuristic(user_message[:HEURISTIC_HEAD_CHARS])
+    warmed = route(category, needs_tools)
+    _start_warm(warmed)
+
+    try:
+        result = await asyncio.wait_for(pre_task, PRE_DEADLINE)
+    except asyncio.TimeoutError:
+        print(f"[PRE] No reply within {PRE_DEADLINE}s, using heuristic")
+        return _heuristic_pre(user_message)
+    if result["category"] != category:
+        model = route(result["category"], result.get("needs_tools", False))
+        if model != warmed:
+            _start_warm(model)
+    return result
+
+
+_warm_tasks: set = set()  # Strong refs so fire-and-forget warm-ups aren't collected
+
+
+def _start_warm(model: str):
+    task = asyncio.create_task(asyncio.to_thread(_warm_model, model))
+    _warm_tasks.add(task)
+    task.add_done_callback(_warm_tasks.discard)
+
+
+def _warm_model(model: str):
+    """Load a model without generating anything (empty prompt)."""
+    try:
+        _client.generate(model=model, prompt="", keep_alive="10m")
+    except Exception as e:
+        print(f"[PRE] Warm-up failed for {model}: {e}")
+
+
+TOOL_SIGNALS = [
+    "search", "fetch", "download", "run", "execute", "install",
+    "file", "read", "write", "open", "browse", "screenshot",
+    "latest", "current", "today", "news", "weather", "price",
+]
+
+HEURISTIC_HEAD_CHARS = 256  # Only the start of a message feeds the heuristics
+
+
+@lru_cache(maxsize=1024)
+def _classify_heuristic(text_head: str) -> tuple:
+    """(category, needs_tools) from one lowercased copy of the message head.
+    Cached, so retries and repeated messages skip the scan entirely."""
+    t = text_head.lower()
+    needs_tools = any(s in t for s in TOOL_SIGNALS)
+    if _RULES_AC is not None:
+        best = min((hit for _, hit in _RULES_AC.iter(t)), default=None)
+        return (best[1] if best else "general_chat"), needs_tools
+    for keywords, category in HEURISTIC_RULES:
         if any(kw in t for kw in keywords):
-            return category
-    return "general_chat"
+            return category, needs_tools
+    return "general_chat", needs_tools
+
+
+def _heuristic_category(text: str) -> str:
+    return _classify_heuristic(text[:HEURISTIC_HEAD_CHARS])[0]
 
 
 def _needs_tools(text: str) -> bool:
-    t = text.lower()
-    tool_signals = [
-        "search", "fetch", "download", "run", "execute", "install",
-        "file", "read", "write", "open", "browse", "screenshot",
-        "latest", "current", "today", "news", "weather", "price",
-    ]
-    return any(s in t for s in tool_signals)
+    return _classify_heuristic(text[:HEURISTIC_HEAD_CHARS])[1]
 
 
 # ── Backwards-compatible shims ────────────────────────────────────────────────
 # Other modules can still call classify_intent() and rewrite_prompt() individually.
 # They'll use the merged call internally and return their slice.
 
-_last_pre: Optional[dict] = None
-_last_input: Optional[str] = None
+@lru_cache(maxsize=32)
+def _pre_cached(user_input: str) -> dict:
+    """One merged call per distinct message, shared by the shims below.
+    Holds several recent messages, so interleaved sessions don't evict each other.
+    Only successful calls are cached; the heuristic fallback is applied outside."""
+    return _llm_pre(user_input)
+
+
+# Last (input, result) for the current task/thread context — concurrent
+# requests each see their own, without locking
+_LAST_PRE: ContextVar = ContextVar("_last_pre", default=None)
+
+
+def _pre_for(user_input: str) -> dict:
+    cur = _LAST_PRE.get()
+    if cur is not None and cur[0] == user_input:
+        return cur[1]
+    r = _with_fallback(_pre_cached, user_input)
+    _LAST_PRE.set((user_input, r))
+    return r
 
 
 def classify_intent(user_input: str) -> dict:
     """Backwards-compatible. Returns intent dict."""
-    global _last_pre, _last_input
-    if _last_input != user_input:
-        _last_pre = run_pre_pipeline(user_input)
-        _last_input = user_input
-    r = _last_pre
+    r = _pre_for(user_input)
     return {
         "category":   r["category"],
         "confidence": r["confidence"],
@@ -173,17 +304,9 @@ def classify_intent(user_input: str) -> dict:
 
 def rewrite_prompt(user_input: str, intent: dict = None) -> str:
     """Backwards-compatible. Returns rewritten prompt."""
-    global _last_pre, _last_input
-    if _last_input != user_input:
-        _last_pre = run_pre_pipeline(user_input)
-        _last_input = user_input
-    return _last_pre.get("rewritten", user_input)
+    return _pre_for(user_input).get("rewritten", user_input)
 
 
 def get_extracted_facts(user_input: str) -> list:
     """Returns facts extracted in the same merged call."""
-    global _last_pre, _last_input
-    if _last_input != user_input:
-        _last_pre = run_pre_pipeline(user_input)
-        _last_input = user_input
-    return _last_pre.get("facts", [])
+    return list(_pre_for(user_input).get("facts", []))
@@ -4,18 +4,23 @@ Routes tasks to the best available model.
 Uses MODEL_MAP for explicit category→model mapping.
 Falls back gracefully if preferred model not installed.
 """
-import subprocess
+import ollama
 import time
 
+# Pooled connection to the local Ollama server
+_client = ollama.Client()
+
 # Cache installed models — refresh every 5 minutes
 _model_cache = {"models": [], "updated": 0.0}
+INSTALLED_TTL = 300
 
-def get_installed_models() -> list:
-    if time.time() - _model_cache["updated"] > 300:
+def get_installed_models(refresh: bool = False) -> list:
+    """Installed model tags via Ollama's HTTP API (no `ollama list` process
+    per lookup). Pass refresh=True after pulling or removing a model."""
+    if refresh or time.time() - _model_cache["updated"] > INSTALLED_TTL:
         try:
-            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-            lines = result.stdout.strip().split('\n')[1:]
-            _model_cache["models"] = [line.split()[0] for line in lines if line.strip()]
+            models = _client.list()["models"]
+            _model_cache["models"] = [m.get("model") or m.get("name") for m in models]
             _model_cache["updated"] = time.time()
         except Exception:
             pass
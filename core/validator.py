@@ -40,6 +40,23 @@ INCOMPLETE_PHRASES = [
     "please wait", "working on it",
 ]
 
+# One Aho-Corasick pass over the output finds every phrase at once; without
+# pyahocorasick we fall back to checking each phrase in turn
+try:
+    import ahocorasick
+    _PHRASE_AC = ahocorasick.Automaton()
+    for _kind, _phrases in enumerate((FAILURE_PHRASES, INCOMPLETE_PHRASES)):
+        for _rank, _phrase in enumerate(_phrases):
+            if _phrase not in _PHRASE_AC:
+                _PHRASE_AC.add_word(_phrase, (_kind, _rank, _phrase))
+    _PHRASE_AC.make_automaton()
+except ImportError:
+    _PHRASE_AC = None
+
+# Code-like content: fences, keywords, or a function call — one pass
+_CODE_RE  = re.compile(r"```|def |class |import |[a-zA-Z_]\w*\s*\(")
+_DIGIT_RE = re.compile(r"\d")
+
 
 def validate_result(result: dict, intent: dict) -> bool:
     """
@@ -66,29 +83,34 @@ def validate_result(result: dict, intent: dict) -> bool:
 
     output_lower = output.lower()
 
-    # Check for refusal phrases
-    for phrase in FAILURE_PHRASES:
-        if phrase in output_lower:
-            result["failure_reason"] = f"model refused: '{phrase}'"
-            return False
-
-    # Check for incompleteness
-    for phrase in INCOMPLETE_PHRASES:
-        if phrase in output_lower:
-            result["failure_reason"] = f"incomplete response: '{phrase}'"
+    if _PHRASE_AC is not None:
+        # Lowest (kind, rank) matches the order of the loops below
+        hit = min((h for _, h in _PHRASE_AC.iter(output_lower)), default=None)
+        if hit:
+            kind, _, phrase = hit
+            result["failure_reason"] = (
+                f"model refused: '{phrase}'" if kind == 0
+                else f"incomplete response: '{phrase}'"
+            )
             return False
+    else:
+        # Check for refusal phrases
+        for phrase in FAILURE_PHRASES:
+            if phrase in output_lower:
+                result["failure_reason"] = f"model refused: '{phrase}'"
+                return False
+
+        # Check for incompleteness
+        for phrase in INCOMPLETE_PHRASES:
+            if phrase in output_lower:
+                result["failure_reason"] = f"incomplete response: '{phrase}'"
+                return False
 
     # Category-specific checks
     if category == "coding" or category == "debugging":
-        # Should have some code-like content
-        has_code = (
-            "```" in output or
-            "def " in output or
-            "class " in output or
-            "import " in output or
-            re.search(r"[a-zA-Z_]\w*\s*\(", output)  # function call pattern
-        )
-        if not has_code and len(output) < 200:
+        # Should have some code-like content (only enforced on short outputs,
+        # so long ones skip the scan entirely)
+        if len(output) < 200 and not _CODE_RE.search(output):
             result["failure_reason"] = "coding task produced no code"
             return False
 
@@ -102,7 +124,7 @@ def validate_result(result: dict, intent: dict) -> bool:
             return False
 
     if category == "math":
-        has_number = bool(re.search(r"\d", output))
+        has_number = bool(_DIGIT_RE.search(output))
         if not has_number:
             result["failure_reason"] = "math task produced no numbers"
             return False
@@ -6,20 +6,15 @@ Infinite resourcefulness. Never gives up.
 
 import time
 import sys
-import json
 import signal
 from datetime import datetime
 from rich.console import Console
 from rich.panel import Panel
-from rich.text import Text
-from rich.live import Live
-from rich.spinner import Spinner
 from rich.table import Table
 from rich.prompt import Prompt
-from rich.markdown import Markdown
 from rich import box
 
-from core.classifier import classify_intent
+from core.classifier import classify
 from core.rewriter import rewrite_prompt
 from core.router import route_to_model, get_fallback
 from core.executor import execute_task
@@ -27,6 +22,7 @@ from core.validator import validate_result
 from core.token_budget import get_token_budget
 from skills.registry import SkillRegistry
 from memory.store import AgentMemory
+from memory.embed_cache import embed_cache
 
 console = Console()
 
@@ -67,13 +63,21 @@ AVAILABLE MODELS (you are running on one of these, routed by task type):
 - qwen2.5:14b      — research, general hard tasks (best)
 - llava:7b / llama3.2-vision:11b — vision tasks
 
+"""
+
+# Per-turn tail, appended after the constant prompt above so Ollama's KV
+# prefix cache can reuse it. Skills change least often, so they go first.
+SYSTEM_CONTEXT = """Available skills: {skills}
 You are currently using: {model}
 Task category: {category}
-Available skills: {skills}
 Relevant past context:
 {context}
 """
 
+# Identical prompts within this window reuse the previous answer outright
+EXACT_CACHE_TTL = 5 * 60
+_exact_cache: dict[tuple, tuple[float, dict]] = {}  # (input, skills version) -> (ts, result)
+
 # ─────────────────────────────────────────────
 # Display helpers
 # ─────────────────────────────────────────────
@@ -98,13 +102,16 @@ def print_routing_info(intent: dict, model: str, latency: str):
     table.add_row("Subtask", f"[dim]{intent.get('subtask', '')}[/dim]")
     console.print(Panel(table, title="[dim]Routing[/dim]", border_style="dim", expand=False))
 
-def print_result(result: dict, duration: float):
+def print_result(result: dict, duration: float, cached: bool = False):
+    from rich.markdown import Markdown  # Pulls in markdown-it; defer until the first answer
     output = result.get("output", "")
     model = result.get("model", "?")
     tool_calls = result.get("tool_calls", 0)
     success = result.get("success", False)
 
     status = "[green]✓ Success[/green]" if success else "[red]✗ Partial[/red]"
+    if cached:
+        status += " [dim](cached)[/dim]"
 
     console.print()
     console.print(Panel(
@@ -138,10 +145,15 @@ def handle_status():
     console.print(Panel(result.stdout or "No models currently loaded", title="Ollama Status"))
 
 def handle_history(memory: AgentMemory, n: int = 10):
-    rows = memory.db.execute(
-        "SELECT timestamp, user_input, intent, model_used, success, duration_ms "
-        "FROM interactions ORDER BY id DESC LIMIT ?", (n,)
-    ).fetchall()
+    # Rows come back display-ready, trimmed by SQLite rather than per row here
+    rows = memory.db.execute("""
+        SELECT COALESCE(substr(timestamp, 1, 16), '?'),
+               substr(user_input, 1, 40) || CASE WHEN length(user_input) > 40 THEN '...' ELSE '' END,
+               substr(COALESCE(NULLIF(model_used, ''), '?'), 1, 20),
+               success,
+               duration_ms
+        FROM interactions ORDER BY id DESC LIMIT ?
+    """, (n,)).fetchall()
 
     table = Table(title="Recent Tasks", box=box.SIMPLE)
     table.add_column("Time", style="dim")
@@ -150,18 +162,9 @@ def handle_history(memory: AgentMemory, n: int = 10):
     table.add_column("OK", justify="center")
     table.add_column("ms", justify="right")
 
-    for row in rows:
-        ts = row[0][:16] if row[0] else "?"
-        inp = row[1][:40] + ("..." if len(row[1]) > 40 else "")
-        try:
-            intent = json.loads(row[2])
-            category = intent.get("category", "?")
-        except Exception:
-            category = str(row[2])[:15]
-        model = (row[3] or "?")[:20]
-        ok = "[green]✓[/green]" if row[4] else "[red]✗[/red]"
-        ms = str(row[5]) if row[5] else "?"
-        table.add_row(ts, inp, model, ok, ms)
+    for ts, inp, model, success, ms in rows:
+        ok = "[green]✓[/green]" if success else "[red]✗[/red]"
+        table.add_row(ts, inp, model, ok, str(ms) if ms else "?")
 
     console.print(table)
 
@@ -178,9 +181,16 @@ def run_agent(
 ):
     t_start = time.time()
 
+    # ── 0. Exact repeat of a recent prompt — skip the whole pipeline ──
+    cache_key = (user_input, registry._version)
+    hit = _exact_cache.get(cache_key)
+    if hit and time.time() - hit[0] < EXACT_CACHE_TTL:
+        print_result(hit[1], time.time() - t_start, cached=True)
+        return hit[1]
+
     # ── 1. Pre-processing pipeline (all on 0.5b, fast) ──
     with console.status("[dim]Classifying intent...[/dim]", spinner="dots"):
-        intent = classify_intent(user_input)
+        intent = classify(user_input)
 
     with console.status("[dim]Rewriting prompt...[/dim]", spinner="dots"):
         rewritten = rewrite_prompt(user_input, intent)
@@ -192,13 +202,17 @@ def run_agent(
     print_routing_info(intent, model, latency)
 
     # ── 2. Build system prompt with context injection ──
-    past = memory.semantic_search(user_input, top_k=3)
+    # Short inputs ("ok", "status") gain nothing from an embedding — use recency
+    if embed_cache.should_skip(user_input):
+        past = memory._recent_interactions(3)
+    else:
+        past = memory.semantic_search(user_input, top_k=3)
     context_str = "\n".join([
         f"- Previously: '{p['input'][:60]}' → '{p['output'][:100]}'"
         for p in past
     ]) or "None yet."
 
-    system = SYSTEM_PROMPT.format(
+    system = SYSTEM_PROMPT + SYSTEM_CONTEXT.format(
         model=model,
         category=intent.get("category", "general"),
         skills=registry.list_skills(),
@@ -275,6 +289,12 @@ def run_agent(
         duration_ms=int(duration * 1000),
     )
 
+    if result and result.get("success"):
+        now = time.time()
+        for k in [k for k, (ts, _) in _exact_cache.items() if now - ts >= EXACT_CACHE_TTL]:
+            del _exact_cache[k]
+        _exact_cache[cache_key] = (now, result)
+
     print_result(result or {"output": "No result.", "success": False}, duration)
     return result
 
@@ -330,6 +350,8 @@ def main():
         else:
             run_agent(user_input, registry, memory)
 
+    memory.flush_embeddings()
+
 
 if __name__ == "__main__":
     main()
@@ -7,47 +7,181 @@ Also skips semantic search entirely for short messages.
 Before: nomic-embed-text called on every incoming message = 0.3-0.8s per message
 After:  cache hit = ~0.001s, cache miss = 0.3-0.8s (only on new unique messages)
 
-The cache is in-memory (dict), lives for the server process lifetime.
-50-entry LRU keeps RAM negligible (~50 * 768 floats * 4 bytes = ~150KB).
+The cache is in-memory (dict), mirrored to a small SQLite file next to the
+agent DB so it survives restarts. 50-entry LRU keeps RAM and disk negligible
+(~50 * 768 floats * 4 bytes = ~150KB).
+
+Near-duplicates ("What's the weather?" vs "whats the weather") also hit: each
+entry keeps a cheap hashed character-trigram vector, and a miss on the exact
+key falls back to a cosine match against those (no embedding call needed).
+Trigrams alone can't tell "install" from "uninstall" or 5pm from 6pm, so a
+match must also have exactly the same words once case, punctuation and
+filler words are ignored.
 """
 
-import hashlib
-import ollama
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
 from collections import OrderedDict
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
 
 EMBED_MODEL = "nomic-embed-text"
 CACHE_SIZE  = 50
 SHORT_MSG_WORD_THRESHOLD = 6  # Skip embed for messages this short
+PROXY_DIM = 512               # Hashed trigram buckets
+SIM_THRESHOLD = 0.87          # Proxy cosine needed to reuse a cached embedding
+
+# Ignored when comparing word sets. Deliberately small: negations, prepositions
+# (on/off, in/out) and question words all change what's being asked
+STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "am", "was", "were", "be", "do", "does",
+    "i", "me", "my", "you", "your", "it", "its", "of", "to", "please", "can",
+    "could", "would", "will", "just", "hey", "hi",
+})
+
+from memory.store import DB_PATH
+CACHE_DB_PATH = os.path.join(os.path.dirname(DB_PATH), "embed_cache.sqlite")
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+# numpy and ollama are imported on first use, and the on-disk mirror is read
+# then too, so importing this module costs nothing at startup.
+
+
+def _content_words(text: str) -> frozenset:
+    return frozenset(_NON_WORD_RE.sub("", text.lower()).split()) - STOPWORDS
+
+
+def _proxy(text: str) -> "np.ndarray":
+    """Unit vector of hashed character trigrams — a stand-in for the real
+    embedding that costs microseconds instead of an Ollama call."""
+    import numpy as np
+    t = " ".join(_NON_WORD_RE.sub("", text.lower()).split())
+    vec = np.zeros(PROXY_DIM, dtype=np.float32)
+    for i in range(max(1, len(t) - 2)):
+        vec[zlib.crc32(t[i:i + 3].encode()) % PROXY_DIM] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
 
 
 class EmbedCache:
-    def __init__(self, max_size: int = CACHE_SIZE):
-        self._cache: OrderedDict[str, list] = OrderedDict()
+    def __init__(self, max_size: int = CACHE_SIZE, db_path: Optional[str] = CACHE_DB_PATH):
+        # key -> (embedding, trigram proxy, original text); one dict, so a hit
+        # is a single lookup and eviction drops everything at once
+        self._cache: OrderedDict[int, tuple] = OrderedDict()
+        self._proxy_index = None  # (keys, stacked proxies), rebuilt after a set
         self._max_size = max_size
         self._hits = 0
         self._misses = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._db_path = db_path
 
-    def _key(self, text: str) -> str:
-        return hashlib.md5(text.encode()).hexdigest()
+    def _open(self):
+        """Open the on-disk mirror and warm the cache from its newest rows.
+        Best-effort: on any error the cache just stays in-memory."""
+        db_path, self._db_path = self._db_path, None  # Only ever try once
+        if not db_path:
+            return
+        import numpy as np
+        try:
+            db = sqlite3.connect(db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS embed_cache (
+                              text       TEXT PRIMARY KEY,
+                              embedding  BLOB NOT NULL,
+                              updated_at REAL NOT NULL
+                          )""")
+            rows = db.execute(
+                "SELECT text, embedding FROM embed_cache ORDER BY updated_at DESC LIMIT ?",
+                (self._max_size,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[EMBED_CACHE] Persistence disabled: {e}")
+            return
+        self._db = db
+        for text, blob in reversed(rows):  # Oldest first, so LRU order holds
+            # hash() is salted per process, so keys are rebuilt from the text
+            self._cache[self._key(text)] = (
+                np.frombuffer(blob, dtype=np.float32).tolist(), _proxy(text), text
+            )
+
+    def _persist(self, text: str, embedding: list):
+        if self._db is None:
+            return
+        import numpy as np
+        try:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embed_cache (text, embedding, updated_at) VALUES (?, ?, ?)",
+                    (text, np.asarray(embedding, dtype=np.float32).tobytes(), time.time()),
+                )
+                self._db.execute(
+                    """DELETE FROM embed_cache WHERE text NOT IN
+                       (SELECT text FROM embed_cache ORDER BY updated_at DESC LIMIT ?)""",
+                    (self._max_size,),
+                )
+        except sqlite3.Error:
+            pass
+
+    def _key(self, text: str) -> int:
+        # In-process only, so the built-in (cached per str object) hash is enough
+        return hash(text)
 
     def get(self, text: str) -> Optional[list]:
+        if self._db_path:
+            self._open()
         k = self._key(text)
-        if k in self._cache:
+        entry = self._cache.get(k)
+        if entry is None:
+            k = self._similar_key(text)
+            entry = self._cache[k] if k is not None else None
+        if entry is not None:
             self._cache.move_to_end(k)  # LRU update
             self._hits += 1
-            return self._cache[k]
+            return entry[0]
         self._misses += 1
         return None
 
+    def _similar_key(self, text: str) -> Optional[int]:
+        """Key of the cached text closest to this one, if close enough."""
+        if not self._cache:
+            return None
+        import numpy as np
+        if self._proxy_index is None:
+            keys = list(self._cache)
+            self._proxy_index = (keys, np.vstack([self._cache[k][1] for k in keys]))
+        keys, proxies = self._proxy_index
+        sims = proxies @ _proxy(text)
+        close = np.flatnonzero(sims >= SIM_THRESHOLD)
+        if not close.size:
+            return None
+        # Closest first; the first with the same content words wins
+        words = _content_words(text)
+        for i in close[np.argsort(-sims[close])]:
+            if _content_words(self._cache[keys[i]][2]) == words:
+                return keys[i]
+        return None
+
     def set(self, text: str, embedding: list):
+        if self._db_path:
+            self._open()
         k = self._key(text)
         if k in self._cache:
             self._cache.move_to_end(k)
         else:
             if len(self._cache) >= self._max_size:
                 self._cache.popitem(last=False)  # Evict oldest
-            self._cache[k] = embedding
+            self._cache[k] = (embedding, _proxy(text), text)
+            self._proxy_index = None
+            self._persist(text, embedding)
 
     def embed(self, text: str) -> Optional[list]:
         """Get embedding, using cache. Returns None on failure."""
@@ -55,6 +189,7 @@ class EmbedCache:
         if cached is not None:
             return cached
         try:
+            import ollama
             resp = ollama.embeddings(model=EMBED_MODEL, prompt=text)
             emb = resp.get("embedding", [])
             if emb:
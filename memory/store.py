@@ -7,10 +7,24 @@ Supports semantic search via embeddings (nomic-embed-text).
 import sqlite3
 import json
 import os
+import queue
 import threading
-import numpy as np
+import time
 from datetime import datetime
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy is imported inside the methods that need it: it's a noticeable slice
+# of cold start on the Pi and nothing uses it before the first embedding.
+
+# Optional: FAISS index over the full history. Without it, search scans the
+# newest SEARCH_WINDOW embeddings with NumPy.
+try:
+    import faiss
+except ImportError:
+    faiss = None
 
 DB_PATH = os.environ.get("AGENT_DB", "/mnt/nvme/agent/memory/agent.db")
 
@@ -19,17 +33,73 @@ if not os.path.exists(os.path.dirname(DB_PATH)):
     os.makedirs("memory", exist_ok=True)
     DB_PATH = "memory/agent.db"
 
+SEARCH_WINDOW = 300  # Most recent embeddings considered by the NumPy fallback
+FAISS_SAVE_EVERY = 20  # Persist the FAISS index after this many additions
+EMBED_BATCH_SIZE = 16   # Max texts per embedding request
+EMBED_BATCH_WAIT = 0.05  # Seconds to gather a batch after the first item
+
+
+def _quantize(embedding) -> "np.ndarray":
+    """Symmetric per-vector int8: round(v / max|v| * 127). Independent of
+    v's magnitude, so the scale is kept separately (see _to_row)."""
+    import numpy as np
+    vec = np.asarray(embedding, dtype=np.float32)
+    max_abs = float(np.abs(vec).max()) if vec.size else 0.0
+    if not max_abs:
+        return np.zeros(vec.shape, dtype=np.int8)
+    return np.round(vec / max_abs * 127).astype(np.int8)
+
+
+def _to_row(embedding) -> tuple:
+    """(scale, int8 bytes) for the embeddings table. The scale makes
+    int8 * scale unit length, so cosine similarity is a plain dot product."""
+    q = _quantize(embedding)
+    return _unit_scale(q), q.tobytes()
+
+
+def _unit_scale(q) -> float:
+    import numpy as np
+    norm = float(np.linalg.norm(q.astype(np.float32)))
+    return 1.0 / norm if norm else 0.0
+
+
+def _from_row(scale, blob) -> "np.ndarray":
+    """float32 vector from an embeddings row (scale NULL = legacy float32 bytes)."""
+    import numpy as np
+    if scale is None:
+        return np.frombuffer(blob, dtype=np.float32)
+    return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * scale
+
 
 class AgentMemory:
     def __init__(self, db_path: str = DB_PATH):
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db_path = db_path
+        # Shared writer (also used directly by UserModel, the proactive engine
+        # etc.), plus a read-only connection per thread for this class's own
+        # queries and a private writer for the embedding worker — WAL lets
+        # them all run without queueing on one handle's mutex
+        self.db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._local = threading.local()
         self.db.execute("PRAGMA journal_mode=WAL")
         self.db.execute("PRAGMA synchronous=NORMAL")
         self.db.execute("PRAGMA cache_size=-32000")    # 32 MB page cache
         self.db.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped I/O
         self.db.execute("PRAGMA temp_store=MEMORY")    # temp tables in RAM
         self._init_schema()
+        # In-memory int8 copy of the most recent embeddings, one row per
+        # interaction, so a search is a single matrix-vector product.
+        # Loaded on first search, appended to as new embeddings land.
+        self._emb_lock = threading.Lock()
+        self._emb_ids: Optional["np.ndarray"] = None
+        self._emb_matrix: Optional["np.ndarray"] = None
+        self._emb_scales: Optional["np.ndarray"] = None
+        self._faiss_path = os.path.splitext(db_path)[0] + ".faiss"
+        self._faiss = None
+        self._faiss_unsaved = 0
+        self._embed_queue: queue.Queue = queue.Queue()
+        self._embed_worker: Optional[threading.Thread] = None
+        self._embed_worker_lock = threading.Lock()
         print(f"[MEMORY] Database: {db_path}")
 
     def _init_schema(self):
@@ -49,7 +119,8 @@ class AgentMemory:
             CREATE TABLE IF NOT EXISTS embeddings (
                 id               INTEGER PRIMARY KEY AUTOINCREMENT,
                 interaction_id   INTEGER NOT NULL,
-                embedding        TEXT    NOT NULL,
+                embedding        BLOB    NOT NULL,  -- int8 array bytes
+                scale            REAL,              -- int8 * scale is unit length
                 FOREIGN KEY(interaction_id) REFERENCES interactions(id)
             );
 
@@ -69,8 +140,68 @@ class AgentMemory:
 
             CREATE INDEX IF NOT EXISTS idx_interactions_timestamp
                 ON interactions(timestamp);
+
+            -- Newest-embeddings load and per-interaction lookups
+            CREATE INDEX IF NOT EXISTS idx_emb_iid
+                ON embeddings(interaction_id);
+
+            -- stats(): GROUP BY model_used and the success count
+            CREATE INDEX IF NOT EXISTS idx_interactions_model_used
+                ON interactions(model_used);
+            CREATE INDEX IF NOT EXISTS idx_interactions_success
+                ON interactions(success);
         """)
         self.db.commit()
+        self._migrate_embeddings()
+
+    def _migrate_embeddings(self):
+        """One-time rewrite of JSON-text and float32 embeddings (older DBs) to
+        int8, and of int8 rows whose scale doesn't make them unit length."""
+        cols = {r[1] for r in self.db.execute("PRAGMA table_info(embeddings)")}
+        if "scale" not in cols:
+            with self.db:
+                self.db.execute("ALTER TABLE embeddings ADD COLUMN scale REAL")
+        # Rescaling is all-or-nothing and new rows are always unit length,
+        # so the oldest int8 row tells whether it has happened
+        oldest = self.db.execute(
+            "SELECT scale, embedding FROM embeddings WHERE scale IS NOT NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+        if oldest and oldest[0] and abs(float((_from_row(*oldest) ** 2).sum()) - 1.0) > 1e-3:
+            import numpy as np
+            updates = [
+                (_unit_scale(np.frombuffer(blob, dtype=np.int8)), row_id)
+                for row_id, blob in self.db.execute(
+                    "SELECT id, embedding FROM embeddings WHERE scale IS NOT NULL"
+                )
+            ]
+            with self.db:
+                self.db.executemany("UPDATE embeddings SET scale=? WHERE id=?", updates)
+            print(f"[MEMORY] Normalised {len(updates)} embeddings to unit length")
+        rows = self.db.execute(
+            "SELECT id, embedding FROM embeddings WHERE scale IS NULL"
+        ).fetchall()
+        if not rows:
+            return
+        updates = []
+        for row_id, value in rows:
+            try:
+                emb = json.loads(value) if isinstance(value, str) else _from_row(None, value)
+                updates.append((*_to_row(emb), row_id))
+            except (ValueError, TypeError):
+                continue
+        with self.db:
+            self.db.executemany("UPDATE embeddings SET scale=?, embedding=? WHERE id=?", updates)
+        print(f"[MEMORY] Migrated {len(updates)} embeddings to int8")
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA query_only=1")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
 
     # ── Logging ─────────────────────────────────────
 
@@ -83,6 +214,29 @@ class AgentMemory:
         success: bool,
         tool_calls: int,
         duration_ms: int,
+    ) -> int:
+        interaction_id = self._insert_interaction(
+            user_input, intent, model, output, success, tool_calls, duration_ms
+        )
+        self.db.commit()
+        self._embed_in_background(interaction_id, user_input, output)
+        return interaction_id
+
+    def post_task_commit(self, log_args: tuple, store_fn=None, *store_args) -> int:
+        """log_interaction(*log_args) plus follow-up writes in one transaction.
+
+        store_fn is called as store_fn(*store_args, commit=False) on this same
+        connection — e.g. UserModel.store_facts for facts learned by the task.
+        """
+        with self.db:
+            interaction_id = self._insert_interaction(*log_args)
+            if store_fn:
+                store_fn(*store_args, commit=False)
+        self._embed_in_background(interaction_id, log_args[0], log_args[3])
+        return interaction_id
+
+    def _insert_interaction(
+        self, user_input, intent, model, output, success, tool_calls, duration_ms
     ) -> int:
         cursor = self.db.execute(
             """INSERT INTO interactions
@@ -99,17 +253,16 @@ class AgentMemory:
                 duration_ms,
             )
         )
-        self.db.commit()
-        interaction_id = cursor.lastrowid
-
-        # Embed in background — don't block log_interaction
-        threading.Thread(
-            target=self._embed_and_store,
-            args=(interaction_id, user_input + " " + output[:400]),
-            daemon=True,
-        ).start()
+        return cursor.lastrowid
 
-        return interaction_id
+    def _embed_in_background(self, interaction_id: int, user_input: str, output: str):
+        # Embed in background — don't block log_interaction. One worker
+        # drains the queue in batches instead of a thread per interaction.
+        with self._embed_worker_lock:
+            if self._embed_worker is None:
+                self._embed_worker = threading.Thread(target=self._embed_worker_loop, daemon=True)
+                self._embed_worker.start()
+        self._embed_queue.put((interaction_id, user_input + " " + output[:400]))
 
     def log_skill_call(self, name: str, description: str, success: bool):
         self.db.execute("""
@@ -123,69 +276,195 @@ class AgentMemory:
 
     # ── Embedding ────────────────────────────────────
 
-    def _embed_and_store(self, interaction_id: int, text: str):
+    def _embed_worker_loop(self):
+        # The worker's own writer, so its inserts never interleave with (or
+        # commit) a transaction open on self.db
+        self._embed_db = sqlite3.connect(self.db_path, timeout=30)
+        self._embed_db.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            batch = [self._embed_queue.get()]
+            time.sleep(EMBED_BATCH_WAIT)  # Let a burst of logs join this batch
+            while len(batch) < EMBED_BATCH_SIZE:
+                try:
+                    batch.append(self._embed_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._embed_and_store(batch)
+            finally:
+                for _ in batch:
+                    self._embed_queue.task_done()
+
+    def flush_embeddings(self, timeout: float = 10.0):
+        """Wait (up to timeout) for queued embeddings to be stored. Call on
+        shutdown — the worker is a daemon thread and won't finish them otherwise."""
+        deadline = time.time() + timeout
+        while self._embed_queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def _embed_and_store(self, batch: list):
+        """Embed [(interaction_id, text), ...] and insert them in one go."""
         try:
             import ollama
-            response = ollama.embeddings(
-                model="nomic-embed-text",
-                prompt=text[:1000]  # Keep it reasonable
-            )
-            embedding = response["embedding"]
-            self.db.execute(
-                "INSERT INTO embeddings (interaction_id, embedding) VALUES (?, ?)",
-                (interaction_id, json.dumps(embedding))
-            )
-            self.db.commit()
+            texts = [text[:1000] for _, text in batch]  # Keep it reasonable
+            try:
+                embeddings = ollama.embed(model="nomic-embed-text", input=texts)["embeddings"]
+            except (AttributeError, TypeError, KeyError, getattr(ollama, "ResponseError", KeyError)):
+                # Older ollama client or server: no batch endpoint
+                embeddings = [
+                    ollama.embeddings(model="nomic-embed-text", prompt=t)["embedding"] for t in texts
+                ]
+            rows = [(interaction_id, emb) for (interaction_id, _), emb in zip(batch, embeddings)]
+            with self._embed_db:
+                self._embed_db.executemany(
+                    "INSERT INTO embeddings (interaction_id, scale, embedding) VALUES (?, ?, ?)",
+                    [(interaction_id, *_to_row(emb)) for interaction_id, emb in rows],
+                )
+            for interaction_id, emb in rows:
+                self._append_embedding(interaction_id, emb)
         except Exception:
             pass  # Embeddings are best-effort; don't fail the whole interaction
 
     def semantic_search(self, query: str, top_k: int = 5) -> list:
         """Find past interactions semantically similar to the query."""
         try:
-            import ollama
-            q_embed = ollama.embeddings(
-                model="nomic-embed-text",
-                prompt=query[:500]
-            )["embedding"]
-            q_vec = np.array(q_embed)
-
-            rows = self.db.execute("""
-                SELECT i.user_input, i.output, i.intent, e.embedding
-                FROM interactions i
-                JOIN embeddings e ON i.id = e.interaction_id
-                ORDER BY i.id DESC
-                LIMIT 300
-            """).fetchall()
-
-            scored = []
-            for row in rows:
-                try:
-                    emb = np.array(json.loads(row[3]))
-                    # Cosine similarity
-                    score = float(
-                        np.dot(q_vec, emb) /
-                        (np.linalg.norm(q_vec) * np.linalg.norm(emb) + 1e-9)
-                    )
-                    scored.append((score, row))
-                except Exception:
-                    continue
-
-            scored.sort(reverse=True)
+            import numpy as np
+            from memory.embed_cache import embed_cache
+            q_embed = embed_cache.embed(query[:500])  # Repeat queries skip the model
+            if q_embed is None:
+                raise RuntimeError("query embedding failed")
+            q_vec = np.asarray(q_embed, dtype=np.float32)
+
+            q_vec /= np.linalg.norm(q_vec) + 1e-9
+            top_ids = self._search_ids(q_vec, top_k)
+            if not top_ids:
+                return []
+
+            placeholders = ",".join("?" * len(top_ids))
+            rows = {
+                r[0]: r for r in self._reader().execute(
+                    f"SELECT id, user_input, output, intent FROM interactions WHERE id IN ({placeholders})",
+                    top_ids,
+                ).fetchall()
+            }
             return [
                 {
-                    "input":  r[1][0],
-                    "output": r[1][1][:300] if r[1][1] else "",
-                    "intent": r[1][2],
+                    "input":  rows[i][1],
+                    "output": rows[i][2][:300] if rows[i][2] else "",
+                    "intent": rows[i][3],
                 }
-                for r in scored[:top_k]
+                for i in top_ids if i in rows
             ]
 
         except Exception:
             # Fall back to recency-based context
             return self._recent_interactions(top_k)
 
+    def _search_ids(self, q_vec: "np.ndarray", top_k: int) -> list:
+        """Interaction ids of the top_k embeddings by cosine similarity to a unit q_vec."""
+        import numpy as np
+        with self._emb_lock:
+            if faiss is not None:
+                if self._faiss is None or self._faiss.d != q_vec.shape[0]:
+                    self._load_faiss(q_vec.shape[0])
+                _, found = self._faiss.search(q_vec[None, :], top_k)
+                return [int(i) for i in found[0] if i != -1]
+            if self._emb_matrix is None:
+                self._load_embeddings()
+            ids, matrix, scales = self._emb_ids, self._emb_matrix, self._emb_scales
+        if not len(ids) or matrix.shape[1] != q_vec.shape[0]:
+            return []
+
+        # Cosine similarity against every row at once, in integer arithmetic:
+        # rows are stored unit length (int8 * scale), so it's a dot product
+        # times each row's scale (ranking only needs q up to a constant)
+        q8 = _quantize(q_vec).astype(np.int32)
+        scores = (matrix.astype(np.int32) @ q8) * scales
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        # O(N) selection of the k best, then sort just those k
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [int(ids[i]) for i in top]
+
+    def _load_faiss(self, dim: int):
+        """Open the saved index, or rebuild it from the DB if it's missing or
+        out of step (e.g. unsaved additions at shutdown). Caller holds _emb_lock."""
+        import numpy as np
+        count = self._reader().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if os.path.exists(self._faiss_path):
+            try:
+                index = faiss.read_index(self._faiss_path)
+                if index.ntotal == count and index.d == dim:
+                    self._faiss = index
+                    return
+            except RuntimeError:
+                pass
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))  # Inner product on unit vectors = cosine
+        ids, vecs = [], []
+        for interaction_id, scale, blob in self._reader().execute(
+            "SELECT interaction_id, scale, embedding FROM embeddings"
+        ):
+            vec = _from_row(scale, blob) if isinstance(blob, bytes) else None
+            if vec is not None and vec.shape[0] == dim:
+                ids.append(interaction_id)
+                vecs.append(vec)  # Already unit length
+        if vecs:
+            index.add_with_ids(np.vstack(vecs).astype(np.float32), np.array(ids, dtype=np.int64))
+        self._faiss = index
+        self._save_faiss()
+
+    def _save_faiss(self):
+        try:
+            faiss.write_index(self._faiss, self._faiss_path)
+            self._faiss_unsaved = 0
+        except RuntimeError as e:
+            print(f"[MEMORY] Could not save FAISS index: {e}")
+
+    def _load_embeddings(self):
+        """Build the int8 search matrix from the newest SEARCH_WINDOW embeddings. Caller holds _emb_lock."""
+        import numpy as np
+        rows = self._reader().execute(
+            "SELECT interaction_id, scale, embedding FROM embeddings ORDER BY interaction_id DESC LIMIT ?",
+            (SEARCH_WINDOW,),
+        ).fetchall()[::-1]
+        rows = [
+            (r[0], r[1], np.frombuffer(r[2], dtype=np.int8))
+            for r in rows if r[1] is not None and isinstance(r[2], bytes)
+        ]
+        dim = rows[-1][2].shape[0] if rows else 0
+        keep = [r for r in rows if r[2].shape[0] == dim]  # Skip other embed models' rows
+        self._emb_ids = np.array([r[0] for r in keep], dtype=np.int64)
+        self._emb_scales = np.array([r[1] for r in keep], dtype=np.float32)
+        self._emb_matrix = np.vstack([r[2] for r in keep]) if keep else np.empty((0, 0), dtype=np.int8)
+
+    def _append_embedding(self, interaction_id: int, embedding):
+        import numpy as np
+        vec = np.asarray(embedding, dtype=np.float32)
+        with self._emb_lock:
+            if self._faiss is not None:
+                if self._faiss.d == vec.shape[0]:
+                    unit = _from_row(*_to_row(vec)).astype(np.float32)[None, :]  # As stored
+                    self._faiss.add_with_ids(unit, np.array([interaction_id], dtype=np.int64))
+                    self._faiss_unsaved += 1
+                    if self._faiss_unsaved >= FAISS_SAVE_EVERY:
+                        self._save_faiss()
+                return
+            if self._emb_matrix is None:
+                return  # Not loaded yet; the first search reads it from the DB
+            if self._emb_matrix.shape[0] and self._emb_matrix.shape[1] != vec.shape[0]:
+                self._emb_matrix = None  # Embedding model changed — reload lazily
+                return
+            q = _quantize(vec)
+            self._emb_ids = np.append(self._emb_ids, interaction_id)[-SEARCH_WINDOW:]
+            self._emb_scales = np.append(self._emb_scales, _unit_scale(q))[-SEARCH_WINDOW:]
+            self._emb_matrix = (
+                np.vstack([self._emb_matrix, q]) if self._emb_matrix.shape[0] else q[None, :]
+            )[-SEARCH_WINDOW:]
+
     def _recent_interactions(self, n: int) -> list:
-        rows = self.db.execute(
+        rows = self._reader().execute(
             "SELECT user_input, output, intent FROM interactions ORDER BY id DESC LIMIT ?",
             (n,)
         ).fetchall()
@@ -194,7 +473,7 @@ class AgentMemory:
     # ── State K/V ────────────────────────────────────
 
     def get_state(self, key: str):
-        row = self.db.execute(
+        row = self._reader().execute(
             "SELECT value FROM agent_state WHERE key=?", (key,)
         ).fetchone()
         return json.loads(row[0]) if row else None
@@ -209,10 +488,11 @@ class AgentMemory:
     # ── Stats ─────────────────────────────────────────
 
     def stats(self) -> dict:
-        total = self.db.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
-        success = self.db.execute("SELECT COUNT(*) FROM interactions WHERE success=1").fetchone()[0]
-        avg_ms = self.db.execute("SELECT AVG(duration_ms) FROM interactions").fetchone()[0]
-        top_models = self.db.execute("""
+        db = self._reader()
+        total = db.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+        success = db.execute("SELECT COUNT(*) FROM interactions WHERE success=1").fetchone()[0]
+        avg_ms = db.execute("SELECT AVG(duration_ms) FROM interactions").fetchone()[0]
+        top_models = db.execute("""
             SELECT model_used, COUNT(*) as n
             FROM interactions
             GROUP BY model_used
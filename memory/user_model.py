@@ -8,13 +8,23 @@ Over time it builds a rich profile that makes the assistant genuinely personal.
 
 import json
 import ollama
+import queue
 import re
+import sqlite3
+import threading
 import time as _time
+import zlib
+from collections import OrderedDict
 from datetime import datetime, date
-from typing import Optional
+from typing import Callable, Optional
 
-# Module-level cache for get_context_for_prompt (invalidated on fact write)
-_ctx_cache: dict = {"value": "", "expires": 0.0}
+PERSONALISE_CACHE_SIZE = 256  # Personalised responses kept per profile version
+# Batched extraction runs at PROFILE_NUM_CTX (below) so it shares the small
+# model's runner: 4 exchanges of <=550 chars plus their output fit in 2048
+EXTRACT_BATCH_SIZE = 4    # Max exchanges per extraction call
+EXTRACT_BATCH_WAIT = 2.0  # Seconds to gather a batch after the first exchange
+EXTRACT_BATCH_USER_CHARS = 400
+EXTRACT_BATCH_ASSISTANT_CHARS = 150
 
 
 # Facts the model tracks with emoji icons for the UI
@@ -54,10 +64,36 @@ Categories: name, location, occupation, interests, family, health, schedule, pre
 
 Return ONLY the JSON array, nothing else."""
 
-PERSONALISE_PROMPT = """You know the following about this user:
+EXTRACT_BATCH_PROMPT = """Extract facts the USER explicitly stated about themselves in each exchange.
+
+Exchanges:
+{exchanges}
+
+Rules:
+- ONLY extract facts from the "user" messages, never from the "assistant" responses
+- ONLY include facts explicitly stated, never inferred or guessed
+- ONLY include first-person statements ("I am", "I live", "my name", "I work")
+- NEVER extract questions, search queries, or topic discussions as facts
+- NEVER store assistant's words as user facts
+- Return [] if no clear first-person facts found
+
+Each fact: {{"idx": <exchange idx>, "category": "...", "fact": "...", "confidence": 0.0-1.0}}
+Categories: name, location, occupation, interests, family, health, schedule, preferences, goals, projects, skills, finances, mood, communication, technology
+
+Return ONLY one JSON array covering all exchanges, nothing else."""
+
+# Every profile-aware prompt on the small model (personalisation here, the
+# proactive engine's sidebar and push checks) starts with this exact block and
+# uses the same num_ctx, so Ollama keeps one runner and reuses the prompt's
+# cached KV prefix instead of re-prefilling the profile on each call.
+PROFILE_PREFIX = """You know the following about this user:
 {user_context}
 
-The user said: {user_message}
+"""
+PROFILE_CONTEXT_CHARS = 600
+PROFILE_NUM_CTX = 2048
+
+PERSONALISE_PROMPT = """The user said: {user_message}
 The assistant's raw response: {response}
 
 Rewrite the response to feel more personal and tailored to this specific user.
@@ -77,10 +113,71 @@ Return JSON: [{{"category": "Reminder|Insight|Suggestion|Alert", "text": "...",
 Return ONLY valid JSON."""
 
 
+# ── _heuristic_extract patterns (compiled once) ─────────────────────────────
+
+_NAME_PATTERNS = tuple(re.compile(p) for p in (
+    r"i'?m ([A-Z][a-z]+)", r"my name is ([A-Z][a-z]+)", r"call me ([A-Z][a-z]+)",
+))
+# Location — handle "I live in X", "remember that I live in X", "based in X"
+_LOC_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r"i (?:live|am|'m) in ([A-Za-z][a-zA-Z\s,]+?)(?:\.|,\s*[A-Z]{2}|$)",
+    r"based in ([A-Za-z][a-zA-Z\s,]+)",
+    r"from ([A-Za-z][a-zA-Z\s]+),\s*([A-Z]{2})",
+))
+_FAMILY_PATTERNS = tuple(re.compile(p) for p in (
+    r"i have (\d+|one|two|three|four|five) kids",
+    r"i have (\d+|one|two|three|four|five) children",
+    r"(\d+|one|two|three|four|five) kids",
+))
+_OCC_PATTERNS = tuple(re.compile(p) for p in (
+    r"i(?:'m| am) (?:a |an )?([a-z]+ (?:developer|engineer|designer|teacher|doctor|lawyer|student|manager|founder|ceo|cto))",
+    r"i work (?:as a?n? )?([a-z ]+)",
+))
+# Interests from common signals
+_INTEREST_SIGNALS = (
+    ("coding", ("python", "javascript", "programming", "coding", "software")),
+    ("music", ("music", "guitar", "piano", "spotify", "playlist")),
+    ("fitness", ("gym", "running", "workout", "exercise", "yoga")),
+    ("cooking", ("recipe", "cooking", "food", "chef", "kitchen")),
+    ("reading", ("book", "reading", "novel", "author", "library")),
+    ("gaming", ("game", "gaming", "steam", "playstation", "xbox")),
+)
+_INTEREST_OF = {kw: interest for interest, kws in _INTEREST_SIGNALS for kw in kws}
+
+# All interest keywords in one pass over the message instead of one substring
+# scan each: an Aho-Corasick automaton if pyahocorasick is installed, else a
+# single alternation (longest first, so "gaming" wins over "game")
+try:
+    import ahocorasick
+    _INTEREST_AC = ahocorasick.Automaton()
+    for _kw, _interest in _INTEREST_OF.items():
+        _INTEREST_AC.add_word(_kw, _interest)
+    _INTEREST_AC.make_automaton()
+    _INTEREST_RE = None
+except ImportError:
+    _INTEREST_AC = None
+    _INTEREST_RE = re.compile("|".join(map(re.escape, sorted(_INTEREST_OF, key=len, reverse=True))))
+
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.DOTALL)
+
+
 class UserModel:
     def __init__(self, memory):
         self.memory = memory
         self._ensure_tables()
+        # Bumped on every fact/preference write; the profile views below are
+        # cached against it, so a repeat call is an int compare
+        self._profile_version = 0
+        self._context_cache: tuple = (-1, "")
+        self._display_cache: tuple = (-1, None)
+        # (profile version, normalised response) -> personalised text
+        self._personalised: OrderedDict = OrderedDict()
+        # Exchanges waiting for LLM extraction; one worker drains them in
+        # batches so a burst of messages costs one model call, not one each
+        self._extract_queue: queue.Queue = queue.Queue()
+        self._extract_worker: Optional[threading.Thread] = None
+        self._extract_worker_lock = threading.Lock()
+        self.on_facts_stored: Optional[Callable[[], None]] = None  # e.g. notify the UI
 
     def _ensure_tables(self):
         self.memory.db.executescript("""
@@ -110,7 +207,46 @@ class UserModel:
 
             CREATE INDEX IF NOT EXISTS idx_user_facts_lookup
                 ON user_facts(confidence DESC, updated_at DESC);
+
+            CREATE INDEX IF NOT EXISTS idx_user_facts_category
+                ON user_facts(category, confidence DESC, updated_at DESC);
         """)
+        # Word-set fingerprint for dedup (see _fingerprint); older DBs lack it
+        cols = {r[1] for r in self.memory.db.execute("PRAGMA table_info(user_facts)")}
+        if "fingerprint" not in cols:
+            self.memory.db.execute("ALTER TABLE user_facts ADD COLUMN fingerprint INTEGER")
+        missing = self.memory.db.execute(
+            "SELECT id, fact FROM user_facts WHERE fingerprint IS NULL"
+        ).fetchall()
+        if missing:
+            self.memory.db.executemany(
+                "UPDATE user_facts SET fingerprint=? WHERE id=?",
+                [(_fingerprint(fact), row_id) for row_id, fact in missing],
+            )
+        self.memory.db.commit()
+        self._ensure_fact_unique_index()
+
+    def _ensure_fact_unique_index(self):
+        """One row per (category, case-insensitive fact), so exact repeats are
+        an index lookup. Older DBs may hold such duplicates: fold them into the
+        newest row (keeping the best confidence) before creating the index."""
+        create = """CREATE UNIQUE INDEX IF NOT EXISTS ux_user_facts_cat_fact
+                    ON user_facts(category, lower(fact))"""
+        try:
+            self.memory.db.execute(create)
+        except sqlite3.IntegrityError:
+            with self.memory.db:
+                self.memory.db.execute("""
+                    UPDATE user_facts SET confidence = (
+                        SELECT MAX(f.confidence) FROM user_facts f
+                        WHERE f.category = user_facts.category AND lower(f.fact) = lower(user_facts.fact)
+                    )""")
+                removed = self.memory.db.execute("""
+                    DELETE FROM user_facts WHERE id NOT IN (
+                        SELECT MAX(id) FROM user_facts GROUP BY category, lower(fact)
+                    )""").rowcount
+                self.memory.db.execute(create)
+            print(f"[USER_MODEL] Merged {removed} duplicate facts")
         self.memory.db.commit()
 
     # ── Fact extraction ───────────────────────────────────────────────────
@@ -134,7 +270,70 @@ class UserModel:
         self._heuristic_extract(user_message)
 
     def extract_from_exchange(self, user_message: str, assistant_response: str):
-        """Deeper LLM-based extraction from the full exchange."""
+        """Deeper LLM-based extraction from the full exchange. Queued and
+        batched with any other exchanges arriving within EXTRACT_BATCH_WAIT."""
+        with self._extract_worker_lock:
+            if self._extract_worker is None:
+                self._extract_worker = threading.Thread(target=self._extract_worker_loop, daemon=True)
+                self._extract_worker.start()
+        self._extract_queue.put((user_message, assistant_response))
+
+    def _extract_worker_loop(self):
+        while True:
+            batch = [self._extract_queue.get()]
+            deadline = _time.time() + EXTRACT_BATCH_WAIT
+            while len(batch) < EXTRACT_BATCH_SIZE:
+                try:
+                    batch.append(self._extract_queue.get(timeout=max(0.0, deadline - _time.time())))
+                except queue.Empty:
+                    break
+            try:
+                if len(batch) == 1:
+                    facts = self.extract_facts(*batch[0])
+                else:
+                    facts = self.extract_facts_batch(batch)
+                self.store_facts(facts)
+                if facts and self.on_facts_stored:
+                    self.on_facts_stored()
+            except Exception as e:
+                print(f"[USER_MODEL] Fact extraction failed: {e}")
+            finally:
+                for _ in batch:
+                    self._extract_queue.task_done()
+
+    def flush_extractions(self, timeout: float = 30.0):
+        """Wait (up to timeout) for queued exchanges to be extracted. Call on shutdown."""
+        deadline = _time.time() + timeout
+        while self._extract_queue.unfinished_tasks and _time.time() < deadline:
+            _time.sleep(0.1)
+
+    def extract_facts_batch(self, exchanges: list) -> list:
+        """One model call for several (user_message, assistant_response) pairs."""
+        listing = "\n".join(
+            json.dumps({"idx": i, "user": u[:EXTRACT_BATCH_USER_CHARS],
+                        "assistant": a[:EXTRACT_BATCH_ASSISTANT_CHARS]}, ensure_ascii=False)
+            for i, (u, a) in enumerate(exchanges)
+        )
+        try:
+            resp = ollama.generate(
+                model="qwen2.5:0.5b",
+                prompt=EXTRACT_BATCH_PROMPT.format(exchanges=listing),
+                options={"temperature": 0.1, "num_predict": 120 * len(exchanges) + 200,
+                         "num_ctx": PROFILE_NUM_CTX}
+            )
+            match = _JSON_ARRAY_RE.search(resp["response"].strip())
+            if not match:
+                return []
+            return [
+                f for f in json.loads(match.group())
+                if isinstance(f, dict) and f.get("fact") and f.get("category")
+                and isinstance(f.get("idx"), int) and 0 <= f["idx"] < len(exchanges)
+            ]
+        except Exception:
+            return []
+
+    def extract_facts(self, user_message: str, assistant_response: str) -> list:
+        """Model call only — returns fact dicts without writing them."""
         try:
             resp = ollama.generate(
                 model="qwen2.5:0.5b",
@@ -142,42 +341,48 @@ class UserModel:
                     user_msg=user_message[:500],
                     assistant_msg=assistant_response[:300],
                 ),
-                options={"temperature": 0.1, "num_predict": 400, "num_ctx": 1024}
+                options={"temperature": 0.1, "num_predict": 250, "num_ctx": 1024}
             )
             text = resp["response"].strip()
             # Find JSON array
-            match = re.search(r"\[.*\]", text, re.DOTALL)
+            match = _JSON_ARRAY_RE.search(text)
             if not match:
-                return
-            facts = json.loads(match.group())
-            for f in facts:
-                if isinstance(f, dict) and f.get("fact") and f.get("category"):
-                    self._store_fact(
-                        category=f["category"],
-                        fact=f["fact"],
-                        confidence=float(f.get("confidence", 0.7)),
-                        source="llm_extract"
-                    )
+                return []
+            return [
+                f for f in json.loads(match.group())
+                if isinstance(f, dict) and f.get("fact") and f.get("category")
+            ]
         except Exception:
-            pass
+            return []
+
+    def store_facts(self, facts: list, commit: bool = True):
+        """Store facts from extract_facts(). commit=False leaves the
+        transaction to the caller (see AgentMemory.post_task_commit)."""
+        for f in facts:
+            try:
+                self._store_fact(
+                    category=f["category"],
+                    fact=f["fact"],
+                    confidence=float(f.get("confidence", 0.7)),
+                    source="llm_extract",
+                    commit=commit,
+                )
+            except Exception:
+                pass
 
     def _heuristic_extract(self, text: str):
         """Fast pattern-based extraction for common facts."""
         t = text.lower()
 
         # Name patterns
-        for pattern in [r"i'?m ([A-Z][a-z]+)", r"my name is ([A-Z][a-z]+)", r"call me ([A-Z][a-z]+)"]:
-            m = re.search(pattern, text)
+        for pattern in _NAME_PATTERNS:
+            m = pattern.search(text)
             if m:
                 self._store_fact("name", m.group(1), confidence=0.9, source="heuristic")
 
-        # Location — handle "I live in X", "remember that I live in X", "based in X"
-        for pattern in [
-            r"i (?:live|am|'m) in ([A-Za-z][a-zA-Z\s,]+?)(?:\.|,\s*[A-Z]{2}|$)",
-            r"based in ([A-Za-z][a-zA-Z\s,]+)",
-            r"from ([A-Za-z][a-zA-Z\s]+),\s*([A-Z]{2})",
-        ]:
-            m = re.search(pattern, text, re.IGNORECASE)
+        # Location
+        for pattern in _LOC_PATTERNS:
+            m = pattern.search(text)
             if m:
                 loc = m.group(1).strip().rstrip(",")
                 if len(loc) > 2:
@@ -185,80 +390,90 @@ class UserModel:
                     break
 
         # Family
-        for pattern in [
-            r"i have (\d+|one|two|three|four|five) kids",
-            r"i have (\d+|one|two|three|four|five) children",
-            r"(\d+|one|two|three|four|five) kids",
-        ]:
-            m = re.search(pattern, t)
+        for pattern in _FAMILY_PATTERNS:
+            m = pattern.search(t)
             if m:
                 self._store_fact("family", f"{m.group(1)} kids", confidence=0.85, source="heuristic")
                 break
 
         # Occupation
-        for pattern in [r"i(?:'m| am) (?:a |an )?([a-z]+ (?:developer|engineer|designer|teacher|doctor|lawyer|student|manager|founder|ceo|cto))", r"i work (?:as a?n? )?([a-z ]+)"]:
-            m = re.search(pattern, t)
+        for pattern in _OCC_PATTERNS:
+            m = pattern.search(t)
             if m:
                 self._store_fact("occupation", m.group(1).strip(), confidence=0.8, source="heuristic")
 
         # Interests from common signals
-        interest_signals = {
-            "coding": ["python", "javascript", "programming", "coding", "software"],
-            "music": ["music", "guitar", "piano", "spotify", "playlist"],
-            "fitness": ["gym", "running", "workout", "exercise", "yoga"],
-            "cooking": ["recipe", "cooking", "food", "chef", "kitchen"],
-            "reading": ["book", "reading", "novel", "author", "library"],
-            "gaming": ["game", "gaming", "steam", "playstation", "xbox"],
-        }
-        for interest, keywords in interest_signals.items():
-            if any(kw in t for kw in keywords):
+        if _INTEREST_AC is not None:
+            matched = {interest for _, interest in _INTEREST_AC.iter(t)}
+        else:
+            matched = {_INTEREST_OF[m.group()] for m in _INTEREST_RE.finditer(t)}
+        for interest, _ in _INTEREST_SIGNALS:  # Table order, as before
+            if interest in matched:
                 self._store_fact("interests", interest, confidence=0.6, source="heuristic")
 
         # Time patterns / schedule
         if any(w in t for w in ["morning", "evening", "night", "weekend", "monday", "every day"]):
             pass  # Store as pattern rather than fact
 
-    def _store_fact(self, category: str, fact: str, confidence: float = 0.8, source: str = ""):
+    def _store_fact(self, category: str, fact: str, confidence: float = 0.8, source: str = "",
+                    commit: bool = True):
         """Store a fact, avoiding near-duplicates."""
-        _ctx_cache["expires"] = 0.0  # invalidate context cache
+        now = datetime.now().isoformat()
+        # Exact repeat (the common case) — one unique-index lookup
+        if self.memory.db.execute(
+            """UPDATE user_facts SET confidence=MAX(confidence, ?), updated_at=?
+               WHERE category=? AND lower(fact)=lower(?)""",
+            (confidence, now, category, fact)
+        ).rowcount:
+            self._profile_version += 1
+            if commit:
+                self.memory.db.commit()
+            return
+
         # Check for existing similar fact
         existing = self.memory.db.execute(
-            "SELECT id, fact FROM user_facts WHERE category=? ORDER BY updated_at DESC LIMIT 5",
+            "SELECT id, fact, fingerprint FROM user_facts WHERE category=? ORDER BY updated_at DESC LIMIT 5",
             (category,)
         ).fetchall()
 
+        fp = _fingerprint(fact)
         for row in existing:
             # Simple dedup: if fact is very similar, update confidence
-            if _similar(row[1], fact):
+            if _similar_fp(row[1], row[2], fact, fp):
                 self.memory.db.execute(
                     "UPDATE user_facts SET confidence=MAX(confidence, ?), updated_at=? WHERE id=?",
-                    (confidence, datetime.now().isoformat(), row[0])
+                    (confidence, now, row[0])
                 )
-                self.memory.db.commit()
+                self._profile_version += 1
+                if commit:
+                    self.memory.db.commit()
                 return
 
         self.memory.db.execute(
-            """INSERT INTO user_facts (category, fact, confidence, source, created_at, updated_at)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (category, fact, confidence, source,
-             datetime.now().isoformat(), datetime.now().isoformat())
+            """INSERT OR IGNORE INTO user_facts (category, fact, confidence, source, created_at, updated_at, fingerprint)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (category, fact, confidence, source, now, now, fp)
         )
-        self.memory.db.commit()
+        self._profile_version += 1
+        if commit:
+            self.memory.db.commit()
 
     # ── Context building ──────────────────────────────────────────────────
 
     def get_context_for_prompt(self) -> str:
         """Build a rich context string for injection into the system prompt."""
-        # 30-second cache — invalidated whenever a fact is written
-        if _time.time() < _ctx_cache["expires"] and _ctx_cache["value"]:
-            return _ctx_cache["value"]
+        version = self._profile_version  # Read first: a write during the build forces a rebuild
+        if self._context_cache[0] == version:
+            return self._context_cache[1]
 
         facts = self.memory.db.execute(
             "SELECT category, fact, confidence FROM user_facts WHERE confidence > 0.5 ORDER BY confidence DESC, updated_at DESC"
         ).fetchall()
 
         if not facts:
-            return "I'm still getting to know you. Tell me about yourself!"
+            result = "I'm still getting to know you. Tell me about yourself!"
+            self._context_cache = (version, result)
+            return result
 
         by_category = {}
         for row in facts:
@@ -279,12 +494,15 @@ class UserModel:
                 lines.append(f"- {cat.capitalize()}: {', '.join(facts_list[:2])}")
 
         result = "\n".join(lines) if lines else "No profile yet."
-        _ctx_cache["value"] = result
-        _ctx_cache["expires"] = _time.time() + 30
+        self._context_cache = (version, result)
         return result
 
     def get_display_profile(self) -> dict:
         """For the UI sidebar."""
+        version = self._profile_version
+        if self._display_cache[0] == version:
+            return self._display_cache[1]
+
         facts = self.memory.db.execute(
             "SELECT category, fact FROM user_facts WHERE confidence > 0.5 ORDER BY confidence DESC, updated_at DESC LIMIT 20"
         ).fetchall()
@@ -307,16 +525,19 @@ class UserModel:
             "SELECT value FROM user_preferences WHERE key='assistant_name'"
         ).fetchone()
 
-        return {
+        profile = {
             "facts": display_facts,
             "assistant_name": name_row[0] if name_row else None,
         }
+        self._display_cache = (version, profile)
+        return profile
 
     def set_preference(self, key: str, value: str):
         self.memory.db.execute(
             "INSERT OR REPLACE INTO user_preferences (key, value, updated_at) VALUES (?, ?, ?)",
             (key, value, datetime.now().isoformat())
         )
+        self._profile_version += 1
         self.memory.db.commit()
 
     def get_preference(self, key: str, default=None) -> Optional[str]:
@@ -327,43 +548,62 @@ class UserModel:
 
     # ── Response personalisation ──────────────────────────────────────────
 
+    def profile_prefix(self, user_context: Optional[str] = None) -> str:
+        """The PROFILE_PREFIX block for a prompt; identical between calls
+        until a fact changes."""
+        if user_context is None:
+            user_context = self.get_context_for_prompt()
+        return PROFILE_PREFIX.format(user_context=user_context[:PROFILE_CONTEXT_CHARS])
+
     def personalise_response(self, user_message: str, response: str) -> str:
         """Light personalisation pass — inject context naturally."""
         user_context = self.get_context_for_prompt()
         if user_context == "No profile yet." or len(user_context) < 30:
             return response  # No profile yet, skip
 
-        # Use user's name if known
-        name_facts = self.memory.db.execute(
-            "SELECT fact FROM user_facts WHERE category='name' AND confidence > 0.7 LIMIT 1"
-        ).fetchone()
-
         # Only do LLM personalisation for longer responses where it's worth it
         if len(response) < 100:
             return response
 
+        key = (self._profile_version, _normalise(response))
+        cached = self._personalised.get(key)
+        if cached is not None:
+            self._personalised.move_to_end(key)
+            return cached
+
         try:
             resp = ollama.generate(
                 model="qwen2.5:0.5b",
-                prompt=PERSONALISE_PROMPT.format(
-                    user_context=user_context[:600],
+                prompt=self.profile_prefix(user_context) + PERSONALISE_PROMPT.format(
                     user_message=user_message[:200],
                     response=response[:800],
                 ),
-                options={"temperature": 0.4, "num_predict": 600, "num_ctx": 2048}
+                options={"temperature": 0.4, "num_predict": 600, "num_ctx": PROFILE_NUM_CTX}
             )
             result = resp["response"].strip()
             # Sanity: if output is much shorter, use original
-            if len(result) > len(response) * 0.5:
-                return result
+            if len(result) <= len(response) * 0.5:
+                result = response
         except Exception:
-            pass
+            return response
 
-        return response
+        self._personalised[key] = result
+        if len(self._personalised) > PERSONALISE_CACHE_SIZE:
+            self._personalised.popitem(last=False)
+        return result
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
+_NORMALISE_RE = re.compile(r"[\W_]+")
+
+
+def _normalise(text: str) -> str:
+    """Lowercased words only — responses differing just in case, spacing or
+    punctuation share one personalisation."""
+    return _NORMALISE_RE.sub(" ", text.lower()).strip()
+
+
 def _similar(a: str, b: str) -> bool:
     """Rough similarity check to avoid storing duplicates."""
     a, b = a.lower().strip(), b.lower().strip()
@@ -379,3 +619,26 @@ def _similar(a: str, b: str) -> bool:
         return False
     overlap = len(words_a & words_b) / max(len(words_a), len(words_b))
     return overlap > 0.7
+
+
+def _fingerprint(text: str) -> int:
+    """63-bit bitmap of the text's lowercased words (crc32-bucketed, so it's
+    stable across restarts and fits a signed SQLite INTEGER)."""
+    fp = 0
+    for w in set(text.lower().split()):
+        fp |= 1 << (zlib.crc32(w.encode()) % 63)
+    return fp
+
+
+def _similar_fp(a: str, fp_a: Optional[int], b: str, fp_b: int) -> bool:
+    """_similar(a, b), skipping the word-set work for pairs the fingerprints
+    already rule out (bit Jaccard < 0.5). Words share bits on collision, so a
+    high bit Jaccard proves nothing and every candidate is confirmed."""
+    if fp_a is None:
+        fp_a = _fingerprint(a)
+    union = (fp_a | fp_b).bit_count()
+    if union and (fp_a & fp_b).bit_count() / union < 0.5:
+        a_l, b_l = a.lower().strip(), b.lower().strip()
+        if not (a_l in b_l or b_l in a_l):
+            return False
+    return _similar(a, b)
@@ -11,9 +11,12 @@ import json
 import ollama
 import re
 import random
-from datetime import datetime, time as dtime
+import time
+from datetime import datetime, timedelta, time as dtime
 from typing import Optional
 
+from memory.user_model import PROFILE_NUM_CTX
+
 
 # How often we can push each type (in minutes)
 PUSH_COOLDOWNS = {
@@ -24,10 +27,12 @@ PUSH_COOLDOWNS = {
     "news":       480,
 }
 
-SIDEBAR_SUGGESTIONS_PROMPT = """Based on what you know about this user, generate 3-4 genuinely useful suggestions for things the assistant could help with right now.
+SIDEBAR_CACHE_TTL = 900      # Seconds a generated sidebar set stays fresh
+GENERAL_PUSH_COOLDOWN = 300  # Seconds between post-message pushes
+DAILY_PUSH_COOLDOWN = 86400  # Morning / end-of-day keys are per date anyway
 
-User profile:
-{user_context}
+# Both prompts follow UserModel.profile_prefix() (shared KV-cached prefix)
+SIDEBAR_SUGGESTIONS_PROMPT = """Based on what you know about this user, generate 3-4 genuinely useful suggestions for things the assistant could help with right now.
 
 Recent activity summary:
 {recent_summary}
@@ -44,9 +49,6 @@ Return ONLY valid JSON."""
 
 PROACTIVE_PUSH_PROMPT = """You are a proactive personal assistant that knows this user well.
 
-User profile:
-{user_context}
-
 Recent exchange:
 User said: {user_message}
 You responded about: {response_summary}
@@ -65,20 +67,53 @@ class ProactiveEngine:
         self.user_model = user_model
         self.memory = memory
         self.registry = registry
-        self._last_push: dict = {}
-        self._sidebar_cache = []
-        self._sidebar_cache_time = None
+        # Cooldowns and the sidebar cache live in the agent DB so a restart
+        # doesn't re-fire pushes or regenerate suggestions straight away
+        self.memory.db.execute("""
+            CREATE TABLE IF NOT EXISTS kv_cache (
+                key        TEXT PRIMARY KEY,
+                value      BLOB,
+                expires_at INTEGER NOT NULL
+            )
+        """)
+        # Per-date cooldown keys would otherwise pile up forever
+        self.memory.db.execute(
+            "DELETE FROM kv_cache WHERE expires_at<=?", (int(time.time()),)
+        )
+        self.memory.db.commit()
+
+    # ── Persistent cache / cooldowns ─────────────────────────────────────
+
+    def _kv_get(self, key: str, now: int):
+        """Stored value for key, or None if missing or expired."""
+        row = self.memory.db.execute(
+            "SELECT value FROM kv_cache WHERE key=? AND expires_at>?", (key, now)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _kv_set(self, key: str, value, expires_at: int):
+        self.memory.db.execute(
+            "INSERT OR REPLACE INTO kv_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+        self.memory.db.commit()
+
+    def _cooling_down(self, key: str, now: int) -> bool:
+        return self._kv_get(key, now) is not None
+
+    def _start_cooldown(self, key: str, now: int, seconds: int):
+        self._kv_set(key, "1", now + seconds)
 
     # ── Sidebar suggestions (shown passively) ────────────────────────────
 
     def get_sidebar_suggestions(self) -> list:
         """Generate context-aware suggestions for the sidebar."""
-        now = datetime.now()
+        ts = int(time.time())
+        cached = self._kv_get("sidebar", ts)
+        if cached is not None:
+            return json.loads(cached)
 
-        # Cache for 15 minutes
-        if (self._sidebar_cache_time and
-                (now - self._sidebar_cache_time).seconds < 900):
-            return self._sidebar_cache
+        now = datetime.now()
 
         user_context = self.user_model.get_context_for_prompt()
         recent = self._get_recent_summary()
@@ -86,32 +121,30 @@ class ProactiveEngine:
 
         # Fast path: if no profile, return generic helpful suggestions
         if "still getting to know you" in user_context:
-            return self._generic_suggestions(time_str)
+            return self._generic_suggestions(now)
 
         try:
             resp = ollama.generate(
                 model="qwen2.5:0.5b",
-                prompt=SIDEBAR_SUGGESTIONS_PROMPT.format(
-                    user_context=user_context[:600],
+                prompt=self.user_model.profile_prefix(user_context) + SIDEBAR_SUGGESTIONS_PROMPT.format(
                     recent_summary=recent[:300],
                     time_str=time_str,
                 ),
-                options={"temperature": 0.7, "num_predict": 400, "num_ctx": 1500}
+                options={"temperature": 0.7, "num_predict": 400, "num_ctx": PROFILE_NUM_CTX}
             )
             text = resp["response"].strip()
             match = re.search(r"\[.*\]", text, re.DOTALL)
             if match:
-                suggestions = json.loads(match.group())
-                self._sidebar_cache = suggestions[:4]
-                self._sidebar_cache_time = now
-                return self._sidebar_cache
+                suggestions = json.loads(match.group())[:4]
+                self._kv_set("sidebar", json.dumps(suggestions), ts + SIDEBAR_CACHE_TTL)
+                return suggestions
         except Exception:
             pass
 
-        return self._generic_suggestions(time_str)
+        return self._generic_suggestions(now)
 
-    def _generic_suggestions(self, time_str: str) -> list:
-        hour = datetime.now().hour
+    def _generic_suggestions(self, now: datetime) -> list:
+        hour = now.hour
         if hour < 10:
             return [
                 {"category": "Morning", "text": "Get a summary of today's priorities", "action": "What should I focus on today?"},
@@ -136,9 +169,8 @@ class ProactiveEngine:
     def check_after_message(self, user_message: str, assistant_response: str) -> Optional[str]:
         """After a response, decide if we should push something proactive."""
         # Rate limit
-        now = datetime.now()
-        last = self._last_push.get("general")
-        if last and (now - last).seconds < 300:  # 5 min minimum between pushes
+        ts = int(time.time())
+        if self._cooling_down("push:general", ts):
             return None
 
         user_context = self.user_model.get_context_for_prompt()
@@ -148,19 +180,20 @@ class ProactiveEngine:
         try:
             resp = ollama.generate(
                 model="qwen2.5:0.5b",
-                prompt=PROACTIVE_PUSH_PROMPT.format(
-                    user_context=user_context[:400],
+                prompt=self.user_model.profile_prefix(user_context) + PROACTIVE_PUSH_PROMPT.format(
                     user_message=user_message[:200],
                     response_summary=assistant_response[:200],
                 ),
-                options={"temperature": 0.5, "num_predict": 200, "num_ctx": 1500}
+                # Only a short JSON verdict comes back: decode little, and
+                # greedily. num_ctx stays shared with the other profile calls
+                options={"temperature": 0.1, "num_predict": 80, "top_k": 10, "num_ctx": PROFILE_NUM_CTX}
             )
             text = resp["response"].strip()
             match = re.search(r"\{.*\}", text, re.DOTALL)
             if match:
                 result = json.loads(match.group())
                 if result.get("push") and result.get("message"):
-                    self._last_push["general"] = now
+                    self._start_cooldown("push:general", ts, GENERAL_PUSH_COOLDOWN)
                     return result["message"]
         except Exception:
             pass
@@ -178,11 +211,11 @@ class ProactiveEngine:
 
         # Morning briefing at 8am
         if hour == 8 and minute < 10:
-            return self._morning_briefing()
+            return self._morning_briefing(now)
 
         # End of day at 5:30pm on weekdays
         if weekday < 5 and hour == 17 and 30 <= minute < 40:
-            return self._end_of_day_message()
+            return self._end_of_day_message(now)
 
         # Weekly review on Sunday evening
         if weekday == 6 and hour == 19 and minute < 10:
@@ -190,37 +223,38 @@ class ProactiveEngine:
 
         return None
 
-    def _morning_briefing(self) -> Optional[str]:
-        cooldown_key = f"morning_{datetime.now().date()}"
-        if self._last_push.get(cooldown_key):
+    def _morning_briefing(self, now: datetime) -> Optional[str]:
+        cooldown_key = f"push:morning_{now.date()}"
+        ts = int(now.timestamp())
+        if self._cooling_down(cooldown_key, ts):
             return None
-        self._last_push[cooldown_key] = datetime.now()
+        self._start_cooldown(cooldown_key, ts, DAILY_PUSH_COOLDOWN)
 
-        user_context = self.user_model.get_context_for_prompt()
         name_fact = self.memory.db.execute(
-            "SELECT fact FROM user_facts WHERE category='name' LIMIT 1"
+            "SELECT fact FROM user_facts WHERE category='name' "
+            "ORDER BY confidence DESC, updated_at DESC LIMIT 1"
         ).fetchone()
         name = f", {name_fact[0]}" if name_fact else ""
 
-        hour = datetime.now().hour
-        greeting = "Good morning" if hour < 12 else "Good afternoon"
+        greeting = "Good morning" if now.hour < 12 else "Good afternoon"
 
         return (
             f"{greeting}{name}! ☀️ I'm here and ready. "
             f"Would you like a briefing on anything, or shall we dive straight into your day?"
         )
 
-    def _end_of_day_message(self) -> Optional[str]:
-        cooldown_key = f"eod_{datetime.now().date()}"
-        if self._last_push.get(cooldown_key):
+    def _end_of_day_message(self, now: datetime) -> Optional[str]:
+        today = now.date().isoformat()
+        cooldown_key = f"push:eod_{today}"
+        ts = int(now.timestamp())
+        if self._cooling_down(cooldown_key, ts):
             return None
-        self._last_push[cooldown_key] = datetime.now()
+        self._start_cooldown(cooldown_key, ts, DAILY_PUSH_COOLDOWN)
 
-        # Count today's interactions
-        today = datetime.now().date().isoformat()
+        # Count today's interactions (ISO timestamps, so a range on the index)
         count = self.memory.db.execute(
-            "SELECT COUNT(*) FROM interactions WHERE timestamp LIKE ?",
-            (f"{today}%",)
+            "SELECT COUNT(*) FROM interactions WHERE timestamp >= ? AND timestamp < ?",
+            (today, (now.date() + timedelta(days=1)).isoformat())
         ).fetchone()[0]
 
         if count == 0:
@@ -23,6 +23,7 @@ pull qwen2.5:0.5b
 echo ""
 echo "── TIER 1: Fast responders (~8GB) ──"
 pull llama3.2:1b
+pull llama3.2:1b-instruct-q4_K_M   # Base of the heartbeat's arc-bg-q4 model
 pull llama3.2:3b
 pull qwen2.5:3b
 pull phi4-mini:3.8b
@@ -26,6 +26,7 @@ from fastapi.staticfiles import StaticFiles
 sys.path.insert(0, str(Path(__file__).parent))
 
 from core.fast_classifier import fast_classify
+from core.pipeline_pre import run_pre_pipeline_async
 from core.router import route_to_model, get_fallback
 from core.token_budget import get_token_budget
 from memory.store import AgentMemory
@@ -75,6 +76,11 @@ async def lifespan(app: FastAPI):
     registry    = SkillRegistry()
     memory      = AgentMemory(DB_PATH)
     user_model  = UserModel(memory)
+    # Facts are extracted in background batches — refresh the sidebar when they land
+    _loop = asyncio.get_running_loop()
+    user_model.on_facts_stored = lambda: asyncio.run_coroutine_threadsafe(
+        broadcast({"type": "profile_updated"}), _loop
+    )
     personality = PersonalityConfig(f"{AGENT_HOME}/memory/personality.json")
     proactive   = ProactiveEngine(user_model, memory, registry)
     task_queue  = TaskQueue(DB_PATH)
@@ -86,7 +92,7 @@ async def lifespan(app: FastAPI):
         registry=registry,
         memory=memory,
         user_model=user_model,
-        broadcast_fn=broadcast,
+        listeners=_broadcast_queues,
     )
     asyncio.create_task(heartbeat.run(), name="heartbeat")
 
@@ -164,6 +170,8 @@ async def lifespan(app: FastAPI):
 
     yield
     heartbeat.stop()
+    await asyncio.to_thread(user_model.flush_extractions)
+    await asyncio.to_thread(memory.flush_embeddings)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -219,7 +227,7 @@ async def get_personality():
 
 @app.get("/events")
 async def event_stream(request: Request):
-    q: asyncio.Queue = asyncio.Queue(maxsize=50)
+    q: asyncio.Queue = asyncio.Queue(maxsize=64)
     _broadcast_queues.add(q)
 
     async def generate():
@@ -277,6 +285,11 @@ async def chat(request: Request):
     )
 
 
+def _route_model(category: str, needs_tools: bool) -> str:
+    """Model the chat path would route this category to (warm-up target)."""
+    return route_to_model({"category": category})["model"]
+
+
 async def _chat_stream(user_message: str, session_id: str = 'default') -> AsyncGenerator[str, None]:
     def sse(t, **kw):
         print(f"[SSE] {t}: {kw}", flush=True)
@@ -285,20 +298,30 @@ async def _chat_stream(user_message: str, session_id: str = 'default') -> AsyncG
     t0 = time.time()
     name = personality.name or "Assistant"
 
-    # Classify immediately (pure heuristic, ~0ms)
+    # Classify immediately (pure heuristic, ~0ms) — only a guess to warm on
     _add_to_history(session_id, "user", user_message)
     intent = fast_classify(user_message)
-    category = intent.get("category", "general_chat")
-    print(f"[CLASSIFY] {intent['_source']}: {category} for: {user_message[:50]}", flush=True)
 
-    # Parallel pre-flight: fetch user context + score previous exchange simultaneously
-    user_ctx, _ = await asyncio.gather(
+    # Parallel pre-flight: user context, score previous exchange, and the
+    # merged 0.5b pre-call (category + rewrite + facts), which warms the
+    # guessed model while it runs
+    user_ctx, _, pre = await asyncio.gather(
         asyncio.to_thread(user_model.get_context_for_prompt),
         asyncio.to_thread(training.score_previous_exchange, user_message, session_id),
+        run_pre_pipeline_async(
+            user_message, route=_route_model,
+            guess=(intent["category"], intent["needs_tools"]),
+        ),
     )
+    if pre["_source"] == "llm":
+        intent = pre
+    category = intent.get("category", "general_chat")
+    print(f"[CLASSIFY] {intent['_source']}: {category} for: {user_message[:50]}", flush=True)
 
-    # Fast heuristic extraction (~0ms) — may update facts immediately
+    # Fast heuristic extraction (~0ms), plus any facts the pre-call found
     await asyncio.to_thread(user_model.extract_from_message, user_message)
+    if intent["facts"]:
+        await asyncio.to_thread(user_model.store_facts, intent["facts"])
     # Notify UI immediately if any facts were extracted
     asyncio.create_task(broadcast({"type": "profile_updated"}))
 
@@ -307,7 +330,7 @@ async def _chat_stream(user_message: str, session_id: str = 'default') -> AsyncG
     latency = route.get("latency", "fast")
     budget  = get_token_budget(latency, category)
 
-    rewritten = user_message
+    rewritten = intent.get("rewritten") or user_message
     # Only search memory if message references past context
     memory_triggers = {"remember", "earlier", "last time", "you said", "we discussed",
                        "before", "previously", "again", "still", "anymore"}
@@ -81,6 +81,7 @@ Environment="OLLAMA_MODELS=/mnt/nvme/ollama/models"
 Environment="OLLAMA_MAX_LOADED_MODELS=1"
 Environment="OLLAMA_NUM_PARALLEL=1"
 Environment="OLLAMA_FLASH_ATTENTION=1"
+Environment="OLLAMA_KV_CACHE_TYPE=q8_0"
 EOF
 sudo systemctl daemon-reload && sudo systemctl enable ollama && sudo systemctl restart ollama
 sleep 2
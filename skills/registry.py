@@ -20,6 +20,8 @@ class SkillRegistry:
     def __init__(self, skills_dir: str = SKILLS_DIR):
         self.skills_dir = skills_dir
         self.skills: dict = {}
+        self._version = 0  # Bumped whenever the skill set changes
+        self._listing: tuple = (-1, "")
         self._load_all()
 
     def _load_all(self):
@@ -38,6 +40,7 @@ class SkillRegistry:
 
             if hasattr(mod, "run") and hasattr(mod, "DESCRIPTION"):
                 self.skills[name] = mod
+                self._version += 1
             else:
                 print(f"[SKILLS] Skipped {name}: missing 'run' or 'DESCRIPTION'")
 
@@ -48,6 +51,7 @@ class SkillRegistry:
     def reload(self):
         """Hot-reload all skills — call this after skill_writer creates a new skill."""
         self.skills = {}
+        self._version += 1
         self._load_all()
 
     def run(self, skill_name: str, **kwargs) -> str:
@@ -64,10 +68,16 @@ class SkillRegistry:
         return self.skills[skill_name].run(**kwargs)
 
     def list_skills(self) -> str:
-        return json.dumps(
-            {name: mod.DESCRIPTION for name, mod in self.skills.items()},
-            indent=2
-        )
+        # Rebuilt only when the skill set changes, so prompts that embed it
+        # stay byte-identical between turns
+        version, listing = self._listing
+        if version != self._version:
+            listing = json.dumps(
+                {name: mod.DESCRIPTION for name, mod in self.skills.items()},
+                indent=2
+            )
+            self._listing = (self._version, listing)
+        return listing
 
     def list_skill_names(self) -> str:
         return ", ".join(self.skills.keys())
@@ -0,0 +1,36 @@
+"""
+tests/test_embed_cache.py
+
+Near-duplicate lookup regressions. Run with: python -m unittest discover tests
+"""
+
+import importlib.util
+import unittest
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy not installed")
+class NearDuplicateTest(unittest.TestCase):
+    def _hit(self, cached: str, query: str) -> bool:
+        from memory.embed_cache import EmbedCache
+        cache = EmbedCache(db_path=None)  # In-memory only
+        cache.set(cached, [1.0, 0.0])
+        return cache.get(query) is not None
+
+    def test_different_intents_miss(self):
+        # Trigram-close, but a different request each time
+        self.assertFalse(self._hit("how do I install numpy on the raspberry pi",
+                                   "how do I uninstall numpy on the raspberry pi"))
+        self.assertFalse(self._hit("remind me to call mum at 5pm",
+                                   "remind me to call mum at 6pm"))
+        self.assertFalse(self._hit("turn on the lights", "turn off the lights"))
+        # "today" narrows the question, so it gets its own embedding
+        self.assertFalse(self._hit("what is the weather", "whats the weather today"))
+
+    def test_same_words_hit(self):
+        self.assertTrue(self._hit("What's the weather in Paris?", "whats the weather in paris"))
+        self.assertTrue(self._hit("Can you summarise this article for me please",
+                                  "can you summarise this article for me"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+tests/test_user_model.py
+
+Fact dedup regressions. Run with: python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import tempfile
+import unittest
+
+
+@unittest.skipUnless(importlib.util.find_spec("ollama"), "ollama not installed")
+class FactDedupTest(unittest.TestCase):
+    def setUp(self):
+        from memory.store import AgentMemory
+        from memory.user_model import UserModel
+        self._tmp = tempfile.TemporaryDirectory()
+        self.memory = AgentMemory(os.path.join(self._tmp.name, "agent.db"))
+        self.model = UserModel(self.memory)
+
+    def tearDown(self):
+        self.memory.db.close()
+        self._tmp.cleanup()
+
+    def _facts(self, category: str) -> list:
+        return [r[0] for r in self.memory.db.execute(
+            "SELECT fact FROM user_facts WHERE category=? ORDER BY id", (category,)
+        )]
+
+    def test_fingerprint_collision_is_not_a_duplicate(self):
+        from memory.user_model import _fingerprint
+        # "coffee" and "tennis" land in the same fingerprint bit
+        self.assertEqual(_fingerprint("likes coffee"), _fingerprint("likes tennis"))
+        self.model._store_fact("interest", "likes coffee")
+        self.model._store_fact("interest", "likes tennis")
+        self.assertEqual(self._facts("interest"), ["likes coffee", "likes tennis"])
+
+    def test_near_duplicates_still_merge(self):
+        self.model._store_fact("interest", "likes coffee")
+        self.model._store_fact("interest", "Likes Coffee")
+        self.model._store_fact("interest", "likes coffee a lot")
+        self.assertEqual(self._facts("interest"), ["likes coffee"])
+
+
+if __name__ == "__main__":
+    unittest.main()